@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import zlib
+
+# --- CONTROL DE ADMISIÓN Y LIMITACIÓN DE TASA PARA /chat ---
+# RateLimiter: un token bucket por cliente (IP y, si existe, sesión).
+# AdmissionController: tope global de peticiones en curso con una cola corta;
+# cuando la cola no está vacía el servidor se considera bajo presión y /chat
+# pasa a modo degradado.
+
+
+class RateLimiter:
+    """
+    Token bucket por clave. Los buckets se reparten en varios "stripes", cada uno
+    con su propio lock, para que clientes distintos no compitan por el mismo lock.
+    """
+
+    def __init__(self, rate, burst, stripes=16, max_keys_per_stripe=4096):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys_per_stripe = max_keys_per_stripe
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+
+    def _stripe_for(self, key):
+        return self._stripes[zlib.crc32(key.encode('utf-8')) % len(self._stripes)]
+
+    def allow(self, key, now=None):
+        """
+        Consume un token para `key`. Retorna (permitido, segundos_hasta_el_próximo_token).
+        """
+        if now is None:
+            now = time.monotonic()
+        buckets, lock = self._stripe_for(key)
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_stripe:
+                    self._prune(buckets, now)
+                bucket = [self.burst, now]
+                buckets[key] = bucket
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / self.rate
+
+    def _prune(self, buckets, now):
+        """Descarta los buckets que ya se recargaron por completo (clientes inactivos)."""
+        idle_after = self.burst / self.rate
+        for key in [k for k, (_, last) in buckets.items() if now - last >= idle_after]:
+            del buckets[key]
+
+
+class AdmissionController:
+    """
+    Limita las peticiones simultáneas a `max_in_flight`. Hasta `max_queue`
+    peticiones adicionales esperan como mucho `queue_timeout` segundos; el resto
+    se rechaza de inmediato.
+    """
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def acquire(self):
+        """
+        Intenta ocupar un lugar. Retorna None si se rechaza, o un booleano que indica
+        si la petición debe atenderse en modo degradado (tuvo que esperar en cola
+        o hay otras peticiones esperando).
+        """
+        with self._condition:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return self.waiting > 0
+            if self.waiting >= self.max_queue:
+                return None
+
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self.in_flight < self.max_in_flight, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                return None
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def is_under_pressure(self):
+        return self.waiting > 0 or self.in_flight >= self.max_in_flight
+
+
+def create_rate_limiter():
+    """Crea el limitador por cliente; RATE_LIMIT_PER_SECOND=0 lo desactiva."""
+    rate = float(os.environ.get("RATE_LIMIT_PER_SECOND", "2"))
+    if rate <= 0:
+        return None
+    return RateLimiter(rate, float(os.environ.get("RATE_LIMIT_BURST", "10")))
+
+
+def create_admission_controller():
+    """Crea el control de admisión global; MAX_IN_FLIGHT=0 lo desactiva."""
+    max_in_flight = int(os.environ.get("MAX_IN_FLIGHT", "8"))
+    if max_in_flight <= 0:
+        return None
+    return AdmissionController(
+        max_in_flight,
+        int(os.environ.get("MAX_QUEUE", "16")),
+        float(os.environ.get("QUEUE_TIMEOUT", "2")),
+    )
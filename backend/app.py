@@ -1,23 +1,29 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import re 
 import logging
+import hashlib
+import threading
+import time
+import math
+from types import SimpleNamespace
+from query_log import create_query_log_writer, anonymize_message, hash_session
+from admission import create_rate_limiter, create_admission_controller
+from static_assets import serve_frontend_file, send_precompressed_bytes
+from tenants import create_tenant_registry
+from passage_index import PASSAGE_SECTIONS, split_documents
+from semantic_index import SEMANTIC_TOP_K, merge_semantic_scores
+from memory_diagnostics import create_memory_diagnostics, structure_report
 
 # Configurar logging para ver mensajes de depuración
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Carga las variables de entorno desde el archivo .env
-load_dotenv() 
-
-app = Flask(__name__)
-CORS(app) 
-
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-
-model = genai.GenerativeModel('gemini-2.5-flash-lite') 
+# Todas las rutas se registran en este blueprint; la aplicación se crea con create_app().
+# Importar este módulo no carga el corpus ni lee .env.
+bp = Blueprint('tupa', __name__)
 
 # --- Historial de Conversación (Memoria) ---
 conversation_log = []
@@ -30,243 +36,65 @@ def add_to_conversation_log(role, text):
     if len(conversation_log) > max_history_length:
         conversation_log[:] = conversation_log[-max_history_length:]
 
-# --- LÓGICA DE CARGA DE PROCEDIMIENTOS TUPA ---
-
-TUPA_DATA_DIR = os.path.join(os.path.dirname(__file__), 'tupa_data')
-tupa_procedures = {} 
+# --- CREACIÓN DE LA APLICACIÓN ---
 
-def load_tupa_data():
+def create_app(warm_up=None):
     """
-    Carga los datos de los procedimientos TUPA desde archivos .txt.
-    Asegura que el 'Titulo:' y 'Código:' sean capturados,
-    y mejora el parseo de la 'Descripción del Servicio' para contenido multilínea.
+    Crea la aplicación Flask con sus servicios: captura de consultas (query_log.py),
+    limitación de tasa y control de admisión (admission.py), registro de tenants
+    (tenants.py) y, si se activa, diagnóstico de memoria (memory_diagnostics.py).
+
+    `warm_up` (o CORPUS_WARMUP) decide cuándo se carga el corpus del tenant por defecto:
+    "background" (por defecto) en un hilo mientras el servidor ya acepta conexiones,
+    "sync" antes de retornar, o "lazy" en la primera petición. Con "background",
+    GET /ready responde 503 hasta que el corpus por defecto está cargado.
     """
-    logging.info(f"Ruta absoluta del directorio TUPA_DATA_DIR: {os.path.abspath(TUPA_DATA_DIR)}")
-
-    if not os.path.exists(TUPA_DATA_DIR):
-        logging.error(f"Error: El directorio {TUPA_DATA_DIR} no existe. Asegúrate de que la carpeta 'tupa_data' esté en el mismo nivel que 'app.py'.")
-        return
-    
-    if not os.path.isdir(TUPA_DATA_DIR):
-        logging.error(f"Error: {TUPA_DATA_DIR} no es un directorio.")
-        return
-
-    files_in_dir = [f for f in os.listdir(TUPA_DATA_DIR) if f.endswith(".txt")]
-    if not files_in_dir:
-        logging.warning(f"El directorio '{TUPA_DATA_DIR}' está vacío o no contiene archivos .txt. No se cargarán datos TUPA.")
-        return
-
-    logging.info(f"Iniciando carga de datos TUPA desde: {TUPA_DATA_DIR}. Archivos encontrados: {files_in_dir}")
-
-    section_keywords = {
-        "Titulo:": "titulo",
-        "Código:": "codigo",
-        "Requisitos:": "requisitos",
-        "Canales de atención:": "canales_atencion",
-        "Pago por derecho de tramitación:": "pago_derecho_tramitacion",
-        "Modalidad de pago:": "modalidad_pago",
-        "Plazo:": "plazo",
-        "Sedes y horarios de atención:": "sedes_horarios",
-        "Unidad de organización donde se presenta la documentación:": "unidad_presentacion",
-        "Unidad de organización responsable de aprobar la solicitud:": "unidad_aprobacion",
-        "Consulta sobre el servicio:": "consulta_servicio"
-    }
-    
-    # NUEVO: Lista de palabras clave para la descripción
-    description_keywords_list = ["Descripción del procedimiento:", "Descripción del Servicio:"]
-
-    sub_section_keywords = {
-        "Monto -": "monto", 
-        "Efectivo:": "efectivo", 
-        "Teléfono:": "telefono_consulta", 
-        "Anexo:": "anexo_consulta", 
-        "Correo:": "correo_consulta" 
-    }
-
-    for filename in files_in_dir:
-        file_path = os.path.join(TUPA_DATA_DIR, filename)
-        logging.info(f"Procesando archivo: {filename}")
-        
-        procedure_data = {
-            "titulo": "",
-            "codigo": "", 
-            "descripcion": "", 
-            "requisitos": [],
-            "canales_atencion": [],
-            "pago_derecho_tramitacion": {"monto": "", "modalidad": []}, 
-            "plazo": "",
-            "sedes_horarios": [],
-            "unidad_presentacion": "",
-            "unidad_aprobacion": "",
-            "consulta_servicio": {"telefono": "", "anexo": "", "correo": ""} 
-        }
-        
-        current_main_section = None 
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                i = 0
-                while i < len(lines):
-                    line = lines[i].strip()
-                    i += 1
-                    
-                    if not line: 
-                        continue
-
-                    matched_section = False
-                    
-                    # Primero, intenta coincidir con las palabras clave de descripción
-                    for desc_kw in description_keywords_list:
-                        if line.startswith(desc_kw):
-                            current_main_section = "descripcion"
-                            desc_content = []
-                            # Si hay contenido en la misma línea después de la palabra clave
-                            if line.replace(desc_kw, "", 1).strip():
-                                desc_content.append(line.replace(desc_kw, "", 1).strip())
-                            
-                            temp_i = i # Usar un índice temporal para leer líneas adicionales de descripción
-                            # Continúa leyendo hasta que encuentre una nueva sección principal o el final del archivo
-                            while temp_i < len(lines) and \
-                                  not any(lines[temp_i].strip().startswith(kw) for kw in section_keywords.keys()) and \
-                                  not any(lines[temp_i].strip().startswith(dk) for dk in description_keywords_list):
-                                if lines[temp_i].strip():
-                                    desc_content.append(lines[temp_i].strip())
-                                temp_i += 1
-                            i = temp_i # Actualiza el índice principal
-                            procedure_data["descripcion"] = " ".join(desc_content).strip()
-                            logging.info(f"DEBUG_DESCRIPCION: Descripción parseada para '{filename}': '{procedure_data['descripcion']}'") 
-                            matched_section = True
-                            break # Salir del bucle de description_keywords_list una vez encontrada
-                    
-                    if matched_section: # Si ya se procesó la descripción, pasar a la siguiente línea
-                        continue 
-
-                    # Luego, verifica las otras palabras clave de sección principales
-                    for keyword, attr_name in section_keywords.items():
-                        if line.startswith(keyword):
-                            current_main_section = attr_name
-                            matched_section = True
-                            
-                            if keyword == "Titulo:":
-                                procedure_data["titulo"] = line.replace(keyword, "", 1).strip()
-                                logging.debug(f"  Título detectado: '{procedure_data['titulo']}'")
-                                break
-                            elif keyword == "Código:":
-                                code_content = line.replace(keyword, "", 1).strip()
-                                if not code_content and i < len(lines):
-                                    next_line_content = lines[i].strip()
-                                    if next_line_content and not any(next_line_content.startswith(kw) for kw in section_keywords.keys()):
-                                        code_content = next_line_content
-                                        i += 1 
-                                procedure_data["codigo"] = code_content
-                                logging.debug(f"  Código detectado: '{procedure_data['codigo']}'")
-                                break
-                            elif keyword == "Plazo:":
-                                procedure_data["plazo"] = line.replace(keyword, "", 1).strip()
-                                logging.debug(f"  Plazo detectado: '{procedure_data['plazo']}'")
-                                break
-                            # Las descripciones ya se manejan arriba, así que este 'elif attr_name == "descripcion":' se elimina.
-                    
-                    if matched_section:
-                        continue 
-
-                    if current_main_section:
-                        def add_to_list_or_concat_last(target_list, current_line):
-                            # Modificado para asegurar que no se añadan líneas vacías o nuevas secciones accidentalmente
-                            if current_line.strip() and not any(current_line.startswith(kw) for kw in section_keywords.keys()) and not any(current_line.startswith(dk) for dk in description_keywords_list):
-                                if re.match(r'^\d+\.-\s*.+', current_line) or re.match(r'^-+\s*.+', current_line): 
-                                    target_list.append(current_line.strip())
-                                else: 
-                                    if target_list:
-                                        target_list[-1] += " " + current_line.strip()
-                                    else: 
-                                        target_list.append(current_line.strip())
-
-                        if current_main_section == "requisitos":
-                            add_to_list_or_concat_last(procedure_data["requisitos"], line)
-                        
-                        elif current_main_section == "canales_atencion":
-                            add_to_list_or_concat_last(procedure_data["canales_atencion"], line)
-                        
-                        elif current_main_section == "sedes_horarios":
-                            add_to_list_or_concat_last(procedure_data["sedes_horarios"], line)
-                        
-                        elif current_main_section == "pago_derecho_tramitacion":
-                            found_sub_section = False
-                            for sub_keyword, sub_attr_name in sub_section_keywords.items():
-                                if line.startswith(sub_keyword):
-                                    if sub_attr_name == "monto":
-                                        procedure_data["pago_derecho_tramitacion"][sub_attr_name] = line.replace(sub_keyword, "", 1).strip()
-                                    found_sub_section = True
-                                    break
-                            if not found_sub_section and line.strip(): 
-                                if line not in procedure_data["pago_derecho_tramitacion"]["modalidad"]:
-                                    procedure_data["pago_derecho_tramitacion"]["modalidad"].append(line.strip())
-                        
-                        elif current_main_section == "modalidad_pago": 
-                            if line.strip() and line not in procedure_data["pago_derecho_tramitacion"]["modalidad"]:
-                                 procedure_data["pago_derecho_tramitacion"]["modalidad"].append(line.strip())
-
-                        elif current_main_section == "unidad_presentacion":
-                            if not any(line.startswith(kw) for kw in section_keywords.keys()) and not any(line.startswith(dk) for dk in description_keywords_list):
-                                if not procedure_data["unidad_presentacion"]:
-                                    procedure_data["unidad_presentacion"] = line.strip()
-                                else:
-                                    procedure_data["unidad_presentacion"] += " " + line.strip()
-                        elif current_main_section == "unidad_aprobacion":
-                            if not any(line.startswith(kw) for kw in section_keywords.keys()) and not any(line.startswith(dk) for dk in description_keywords_list):
-                                if not procedure_data["unidad_aprobacion"]:
-                                    procedure_data["unidad_aprobacion"] = line.strip()
-                                else:
-                                    procedure_data["unidad_aprobacion"] += " " + line.strip()
-
-                        elif current_main_section == "consulta_servicio":
-                            found_sub_section = False
-                            for sub_keyword, sub_attr_name in sub_section_keywords.items():
-                                if line.startswith(sub_keyword):
-                                    if sub_attr_name in ["telefono_consulta", "anexo_consulta", "correo_consulta"]:
-                                        procedure_data["consulta_servicio"][sub_attr_name.replace('_consulta', '')] = line.replace(sub_keyword, "", 1).strip()
-                                        found_sub_section = True
-                                        break
-                            if not found_sub_section and line.strip(): 
-                                if re.search(r'\b(tel(?:éfono)?|cel(?:ular)?|anexo)\b', line.lower()) or re.match(r'^\d{6,}', line.strip()):
-                                    procedure_data["consulta_servicio"]["telefono"] = line.strip()
-                                elif "@" in line:
-                                    procedure_data["consulta_servicio"]["correo"] = line.strip()
-                                elif "anexo" in line.lower():
-                                    procedure_data["consulta_servicio"]["anexo"] = line.strip()
-
-        except Exception as e:
-            logging.error(f"Error al procesar el archivo {filename}: {e}")
-            logging.error(f"Contenido actual de procedure_data antes del error: {procedure_data}")
-            continue 
-
-        final_key_for_search = procedure_data["titulo"].lower().strip() if procedure_data["titulo"] else os.path.splitext(filename)[0].lower()
-        
-        original_final_key = final_key_for_search
-        counter = 1
-        while final_key_for_search in tupa_procedures:
-            final_key_for_search = f"{original_final_key}-{counter}"
-            counter += 1
-        
-        tupa_procedures[final_key_for_search] = procedure_data
-        
-        if procedure_data["codigo"] and procedure_data["codigo"].lower().strip() not in tupa_procedures:
-             tupa_procedures[procedure_data["codigo"].lower().strip()] = procedure_data
-        
-        logging.info(f"Cargado TUPA: \"{procedure_data['titulo'] if procedure_data['titulo'] else 'N/A'}\" (Clave principal: \"{final_key_for_search}\")")
-        logging.debug(f"  Datos finales de '{filename}':")
-        logging.debug(f"    Título: '{procedure_data['titulo']}'")
-        logging.debug(f"    Código: '{procedure_data['codigo']}'")
-        logging.debug(f"    Descripción (inicio): '{procedure_data['descripcion'][:100]}...'")
-        logging.debug(f"    Requisitos (num): {len(procedure_data['requisitos'])}")
-    
-    logging.info(f"Carga de datos TUPA finalizada. Total de procedimientos cargados: {len(tupa_procedures)}")
-    logging.info(f"Claves principales de procedimientos cargados: {list(tupa_procedures.keys())}")
+    # Carga las variables de entorno desde el archivo .env
+    load_dotenv()
+
+    # static_folder=None: el frontend se sirve con las rutas de static_assets.py
+    app = Flask(__name__, static_folder=None)
+    CORS(app)
+    # Detrás de un proxy inverso remote_addr es el del proxy y todos los ciudadanos
+    # compartirían un mismo bucket: TRUSTED_PROXIES=N toma la IP de X-Forwarded-For
+    # (solo si hay exactamente N proxies de confianza delante; si no, es falsificable)
+    trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", "0"))
+    if trusted_proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+    tupa = SimpleNamespace(
+        # Primero: con MEMORY_DIAGNOSTICS=1 inicia tracemalloc antes de cargar el corpus
+        memory_diagnostics=create_memory_diagnostics(),
+        query_log_writer=create_query_log_writer(),
+        query_log_salt=os.environ.get("QUERY_LOG_SALT", ""),
+        rate_limiter=create_rate_limiter(),
+        admission_controller=create_admission_controller(),
+        tenant_registry=create_tenant_registry(),
+        ready=threading.Event(),
+    )
+    app.extensions['tupa'] = tupa
+    app.register_blueprint(bp)
+
+    warm_up = warm_up or os.environ.get("CORPUS_WARMUP", "background")
+    if warm_up == "sync":
+        warm_up_corpus(tupa)
+    elif warm_up == "background":
+        threading.Thread(target=warm_up_corpus, args=(tupa,), name="corpus-warm-up", daemon=True).start()
+    else:
+        # Carga perezosa: la aplicación ya puede atender; la primera petición paga la carga
+        tupa.ready.set()
+    return app
 
+def warm_up_corpus(tupa):
+    """Carga el tenant por defecto y marca la aplicación como lista."""
+    start = time.perf_counter()
+    tupa.tenant_registry.get(tupa.tenant_registry.default_tenant_id)
+    tupa.ready.set()
+    logging.info(f"Corpus por defecto listo en {time.perf_counter() - start:.3f} s.")
 
-load_tupa_data()
+def services():
+    """Servicios de la aplicación en curso (ver create_app)."""
+    return current_app.extensions['tupa']
 
 # --- FUNCIONES DE BÚSQUEDA Y LÓGICA DE RESPUESTA ---
 
@@ -285,7 +113,7 @@ def clean_query_for_search(query):
     words = [word for word in cleaned.split() if len(word) > 2 and word not in STOP_WORDS]
     return " ".join(words)
 
-def find_matching_procedures(user_query):
+def find_matching_procedures(user_query, procedures):
     """
     Encuentra procedimientos TUPA que coinciden con la consulta del usuario
     y les asigna una puntuación de relevancia.
@@ -296,7 +124,7 @@ def find_matching_procedures(user_query):
     
     unique_procedures_seen = set()
     unique_procedures_list = []
-    for proc_data in tupa_procedures.values():
+    for proc_data in procedures.values():
         if id(proc_data) not in unique_procedures_seen:
             unique_procedures_seen.add(id(proc_data))
             unique_procedures_list.append(proc_data)
@@ -432,40 +260,273 @@ def find_matching_procedures(user_query):
 
 # --- RUTAS DE LA API ---
 
-@app.route('/tupa_titles', methods=['GET'])
-def get_tupa_titles():
+def chat_response(payload, branch, status=200):
+    """
+    Responde a /chat dejando registrada la rama de decisión que produjo la respuesta.
+    Si la petición pasó por la búsqueda completa, la respuesta queda en la caché del tenant.
+    """
+    g.chat_branch = branch
+    cache_key = g.pop('response_cache_key', None)
+    if cache_key is not None and status == 200:
+        g.tenant.response_cache.put(cache_key, (payload, branch))
+    return jsonify(payload), status
+
+@bp.before_request
+def start_allocation_tracking():
+    memory_diagnostics = services().memory_diagnostics
+    if memory_diagnostics is not None and request.endpoint != 'tupa.memory_report':
+        # Werkzeug lee el cuerpo con un búfer fijo de 64 KiB que taparía el pico propio
+        # de la petición: se parsea antes de empezar a medir (Flask guarda el resultado)
+        request.get_json(silent=True)
+        g.allocation_start = memory_diagnostics.start_request()
+
+@bp.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.before_request
+def admit_chat_request():
+    """
+    Aplica el token bucket por IP y por sesión, y luego el tope global de peticiones
+    en curso. Las peticiones rechazadas reciben 429/503 con Retry-After sin llegar
+    a la lógica de búsqueda.
+    """
+    if request.endpoint != 'tupa.chat':
+        return None
+
+    rate_limiter = services().rate_limiter
+    admission_controller = services().admission_controller
+    if rate_limiter is not None:
+        client_keys = [f"ip:{request.remote_addr}"]
+        session_id = request.headers.get('X-Session-Id')
+        if session_id:
+            client_keys.append(f"session:{session_id}")
+        for key in client_keys:
+            allowed, retry_after = rate_limiter.allow(key)
+            if not allowed:
+                logging.warning(f"Límite de tasa excedido para {key}")
+                response = jsonify({
+                    "response": "Estás enviando mensajes demasiado rápido. Por favor, espera unos segundos e inténtalo de nuevo.",
+                    "response_type": "text"
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+
+    if admission_controller is not None:
+        degraded = admission_controller.acquire()
+        if degraded is None:
+            logging.warning("Servidor saturado: petición /chat rechazada por el control de admisión.")
+            response = jsonify({
+                "response": "El asistente está atendiendo muchas consultas en este momento. Por favor, inténtalo de nuevo en unos segundos.",
+                "response_type": "text"
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = "1"
+            return response
+        g.admitted = True
+        g.degraded = degraded
+    return None
+
+# Rutas que responden con los datos de un tenant concreto
+TENANT_ENDPOINTS = {'tupa.chat', 'tupa.get_tupa_titles', 'tupa.autocomplete', 'tupa.corpus_version', 'tupa.search_index',
+                    'tupa.passages', 'tupa.procedures_requiring'}
+
+def resolve_tenant_id():
+    """Tenant de la petición: ruta /t/<tenant>/..., cabecera X-Tenant o subdominio del Host."""
+    tenant_id = (request.view_args or {}).get('tenant_id') or request.headers.get('X-Tenant')
+    if not tenant_id:
+        subdomain = request.host.split(':')[0].split('.')[0].lower()
+        if subdomain in services().tenant_registry.data_dirs:
+            tenant_id = subdomain
+    return (tenant_id or services().tenant_registry.default_tenant_id).lower()
+
+@bp.before_request
+def load_request_tenant():
+    if request.endpoint not in TENANT_ENDPOINTS:
+        return None
+    tenant_id = resolve_tenant_id()
+    tenant = services().tenant_registry.get(tenant_id)
+    if tenant is None:
+        return jsonify({"error": f"Municipalidad desconocida: {tenant_id}"}), 404
+    g.tenant = tenant
+    return None
+
+@bp.teardown_request
+def release_chat_slot(exc):
+    if g.pop('admitted', False):
+        services().admission_controller.release()
+
+@bp.after_request
+def record_request_allocations(response):
+    """Registrada antes que capture_chat_request, así que corre después y mide también la captura."""
+    if 'allocation_start' in g:
+        branch = g.get('chat_branch') or request.endpoint
+        services().memory_diagnostics.finish_request(g.pop('allocation_start'), branch)
+    return response
+
+@bp.after_request
+def capture_chat_request(response):
+    """
+    Expone la rama de decisión en la cabecera X-Chat-Branch y, si la captura está
+    activada, encola el registro anonimizado de la consulta. Aquí solo se arma
+    un diccionario: la escritura a disco ocurre en el hilo de QueryLogWriter.
+    """
+    if request.endpoint != 'tupa.chat':
+        return response
+
+    branch = g.get('chat_branch', '')
+    if branch:
+        response.headers['X-Chat-Branch'] = branch
+
+    query_log_writer = services().query_log_writer
+    if query_log_writer is not None:
+        payload = request.get_json(silent=True) or {}
+        session_id = request.headers.get('X-Session-Id') or payload.get('session_id') or request.remote_addr
+        query_log_writer.submit({
+            "ts": time.time(),
+            "tenant": g.tenant.tenant_id if 'tenant' in g else "",
+            "session": hash_session(session_id, services().query_log_salt),
+            "message": anonymize_message(str(payload.get('message', ''))),
+            "branch": branch,
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - g.request_start) * 1000, 3),
+            "response_sha": hashlib.sha1(response.get_data()).hexdigest(),
+        })
+    return response
+
+@bp.route('/', methods=['GET'])
+@bp.route('/t/<tenant_id>/', methods=['GET'])
+def index(tenant_id=None):
+    """Sirve el frontend desde el mismo origen que la API (sin preflight CORS)."""
+    return serve_frontend_file('index.html')
+
+@bp.route('/<path:filename>', methods=['GET'])
+@bp.route('/t/<tenant_id>/<path:filename>', methods=['GET'])
+def frontend_file(filename, tenant_id=None):
+    return serve_frontend_file(filename)
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    """Sonda de disponibilidad: 200 cuando el corpus por defecto está cargado, 503 mientras tanto."""
+    tupa = services()
+    is_ready = tupa.ready.is_set()
+    tenants = [t.tenant_id for t in tupa.tenant_registry.resident_tenants()]
+    return jsonify({"ready": is_ready, "tenants": tenants}), 200 if is_ready else 503
+
+@bp.route('/diagnostics/memory', methods=['GET'])
+def memory_report():
+    """Memoria por archivo y por estructura, y asignaciones por petición; solo con MEMORY_DIAGNOSTICS=1."""
+    memory_diagnostics = services().memory_diagnostics
+    if memory_diagnostics is None:
+        return jsonify({"error": "Diagnóstico de memoria desactivado (MEMORY_DIAGNOSTICS=1)."}), 404
+    return jsonify({
+        "tracemalloc": memory_diagnostics.snapshot_report(request.args.get('top', 15, type=int)),
+        "estructuras": structure_report(services(), conversation_log),
+        "peticiones": memory_diagnostics.request_report(),
+    })
+
+@bp.route('/tupa_titles', methods=['GET'])
+@bp.route('/t/<tenant_id>/tupa_titles', methods=['GET'])
+def get_tupa_titles(tenant_id=None):
     """Retorna una lista de todos los títulos de procedimientos TUPA únicos."""
-    unique_titles_set = set()
-    for details in tupa_procedures.values():
-        if details.get('titulo'):
-            unique_titles_set.add(details['titulo'])
-    
-    titles = sorted(list(unique_titles_set))
+    titles = sorted(proc['titulo'] for proc in g.tenant.procedure_list if proc.get('titulo'))
     return jsonify({"titles": titles})
 
-@app.route('/chat', methods=['POST'])
-def chat():
+@bp.route('/autocomplete', methods=['GET'])
+@bp.route('/t/<tenant_id>/autocomplete', methods=['GET'])
+def autocomplete(tenant_id=None):
+    """Retorna los procedimientos cuyo título, código o sinónimo empieza con `q`."""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', type=int)
+    return jsonify({"suggestions": g.tenant.autocomplete_index.complete(query, limit)})
+
+@bp.route('/passages', methods=['GET'])
+@bp.route('/t/<tenant_id>/passages', methods=['GET'])
+def passages(tenant_id=None):
+    """Busca en requisitos, canales, sedes y modalidad de pago (p. ej. `q=donde pago en caja`)."""
+    query = request.args.get('q', '')
+    section = request.args.get('section')
+    if section and section not in PASSAGE_SECTIONS:
+        return jsonify({"error": f"Sección desconocida: {section}", "sections": list(PASSAGE_SECTIONS)}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify({"results": g.tenant.passage_index.search(query, section, limit)})
+
+@bp.route('/procedures_requiring', methods=['GET'])
+@bp.route('/t/<tenant_id>/procedures_requiring', methods=['GET'])
+def procedures_requiring(tenant_id=None):
+    """Procedimientos cuyos requisitos mencionan todos los documentos (`doc=dni&doc=soat` o `q=copia de dni y soat`)."""
+    documents = request.args.getlist('doc') or split_documents(request.args.get('q', ''))
+    procs = g.tenant.passage_index.procedures_requiring(documents)
+    return jsonify({
+        "documents": documents,
+        "procedures": [{"titulo": p.get('titulo', ''), "codigo": p.get('codigo', '')} for p in procs],
+    })
+
+@bp.route('/corpus_version', methods=['GET'])
+@bp.route('/t/<tenant_id>/corpus_version', methods=['GET'])
+def corpus_version(tenant_id=None):
+    """Versión del corpus; el navegador la compara con la de su índice en caché."""
+    response = jsonify({"version": g.tenant.search_bundle["version"]})
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/search_index.json', methods=['GET'])
+@bp.route('/t/<tenant_id>/search_index.json', methods=['GET'])
+def search_index(tenant_id=None):
+    """Índice de búsqueda del navegador; inmutable cuando se pide con ?v=<versión actual>."""
+    tenant = g.tenant
+    version = tenant.search_bundle["version"]
+    return send_precompressed_bytes(tenant.search_bundle_json, tenant.search_bundle_gzip, 'application/json',
+                                    etag=version, immutable=request.args.get('v') == version)
+
+# "¿qué trámites piden copia de DNI y SOAT?" -> se responde con el índice de pasajes
+REQUIREMENTS_QUERY_RE = re.compile(
+    r'\b(?:que|qué|cuales|cuáles)\s+(?:tramites|trámites|procedimientos)\s+'
+    r'(?:me\s+)?(?:piden|requieren|exigen|necesitan|solicitan)\s+(.+?)[\s?¿!.]*$'
+)
+MAX_REQUIREMENT_SUGGESTIONS = 10
+
+@bp.route('/chat', methods=['POST'])
+@bp.route('/t/<tenant_id>/chat', methods=['POST'])
+def chat(tenant_id=None):
     """
     Maneja las solicitudes de chat del usuario, buscando en los procedimientos TUPA
     y utilizando Gemini como fallback si no se encuentra información relevante localmente.
     """
     user_message = request.json.get('message', '').lower()
     if not user_message:
-        return jsonify({"response": "No se recibió ningún mensaje.", "response_type": "text"}), 400
+        return chat_response({"response": "No se recibió ningún mensaje.", "response_type": "text"}, "mensaje_vacio", 400)
 
     logging.info(f"Mensaje del usuario recibido: {user_message}")
     
     # Añadir mensaje del usuario al historial de conversación
     add_to_conversation_log("user", user_message)
 
+    # --- Modo degradado: bajo presión solo se atienden coincidencias directas de título o código ---
+    if g.get('degraded', False):
+        return respond_degraded(user_message)
+
+    # --- Caché de respuestas del tenant: la respuesta depende solo del mensaje ---
+    cached = g.tenant.response_cache.get(user_message)
+    if cached is not None:
+        payload, branch = cached
+        if payload.get("response_type") == "suggestions":
+            add_to_conversation_log("model", payload["message"] + " Opciones: " + ", ".join(payload["suggestions"]))
+        else:
+            add_to_conversation_log("model", payload["response"])
+        return chat_response(payload, branch)
+    g.response_cache_key = user_message
+
+    # --- Consultas por documento requerido: agregación sobre los requisitos, sin puntuar títulos ---
+    requirements_match = REQUIREMENTS_QUERY_RE.search(user_message)
+    if requirements_match:
+        return respond_requirements_query(split_documents(requirements_match.group(1)))
+
     # Obtenemos los posibles procedimientos con sus scores
+    # procedure_list ya viene sin duplicados (ver near_duplicates.py): un registro y un título por procedimiento
     all_scored_procedures = []
-    unique_procedures_list = []
-    unique_procedures_seen_ids = set()
-    for proc_data in tupa_procedures.values():
-        if id(proc_data) not in unique_procedures_seen_ids:
-            unique_procedures_seen_ids.add(id(proc_data))
-            unique_procedures_list.append(proc_data)
+    unique_procedures_list = g.tenant.procedure_list
 
     user_query_cleaned = clean_query_for_search(user_message) 
     query_words = user_query_cleaned.split()
@@ -556,6 +617,10 @@ def chat():
 
         if score > 0:
             all_scored_procedures.append((score, details))
+    # Recuperación semántica opcional: reordena por similitud de n-gramas los procedimientos que ya coinciden por palabras clave
+    if g.tenant.semantic_index is not None:
+        all_scored_procedures = merge_semantic_scores(
+            all_scored_procedures, g.tenant.semantic_index.search(user_message, SEMANTIC_TOP_K))
     all_scored_procedures.sort(key=lambda x: x[0], reverse=True)
 
 
@@ -565,10 +630,10 @@ def chat():
             logging.info(f"Coincidencia exacta con título TUPA para '{user_message}'. Mostrando detalles.")
             response_text = format_procedure_details(proc)
             add_to_conversation_log("model", response_text) 
-            return jsonify({
+            return chat_response({
                 "response": response_text,
                 "response_type": "text"
-            })
+            }, "titulo_exacto")
     # --- FIN Lógica para MANEJO DE SELECCIÓN DIRECTA DE SUGERENCIAS ---
 
 
@@ -588,10 +653,10 @@ def chat():
             logging.info(f"Coincidencia directa para consulta de licencia: {license_tupa_found.get('titulo')}")
             response_text = format_procedure_details(license_tupa_found)
             add_to_conversation_log("model", response_text) 
-            return jsonify({
+            return chat_response({
                 "response": response_text,
                 "response_type": "text"
-            })
+            }, "licencia_conducir")
         else:
             response_text = (
                 "Estimado ciudadano, la **licencia de conducir (brevete)** no se tramita en la Municipalidad Provincial de Puno. "
@@ -599,7 +664,7 @@ def chat():
                 "Le recomiendo visitar sus sitios web oficiales o contactarlos directamente para obtener información precisa sobre los requisitos y pasos para sacar su licencia."
             )
             add_to_conversation_log("model", response_text) 
-            return jsonify({"response": response_text, "response_type": "text"})
+            return chat_response({"response": response_text, "response_type": "text"}, "licencia_conducir_externa")
 
 
     # --- Lógica para manejo específico de "LICENCIA DE EDIFICACIÓN" ---
@@ -623,29 +688,22 @@ def chat():
             logging.info(f"Coincidencia directa para consulta de edificación: {edificacion_tupa_found.get('titulo')}")
             response_text = format_procedure_details(edificacion_tupa_found)
             add_to_conversation_log("model", response_text) 
-            return jsonify({
+            return chat_response({
                 "response": response_text,
                 "response_type": "text"
-            })
+            }, "edificacion")
         else:
             if relevant_edificacion_suggestions:
-                suggestions_list = []
-                seen_titles = set()
-                for proc in relevant_edificacion_suggestions:
-                    if proc.get('titulo') and proc['titulo'].lower().strip() not in seen_titles:
-                        suggestions_list.append(proc['titulo'])
-                        seen_titles.add(proc['titulo'].lower().strip())
-                    if len(suggestions_list) >= 5: 
-                        break
+                suggestions_list = [proc['titulo'] for proc in relevant_edificacion_suggestions if proc.get('titulo')][:5]
                 
                 if suggestions_list:
                     response_message = "He encontrado varios procedimientos de edificación que podrían ser relevantes. ¿Te refieres a alguno de estos o quieres especificar más? Si hay más, puedo ayudarte a buscar."
                     add_to_conversation_log("model", response_message + " Opciones: " + ", ".join(suggestions_list)) 
-                    return jsonify({
+                    return chat_response({
                         "response_type": "suggestions",
                         "message": response_message,
                         "suggestions": suggestions_list
-                    })
+                    }, "edificacion_sugerencias")
             
             response_text = (
                 "Para trámites de **Licencia de Edificación**, te sugiero consultar la fuente oficial de la Municipalidad Provincial de Puno, "
@@ -653,7 +711,7 @@ def chat():
                 "¿Hay algún otro trámite municipal en el que pueda ayudarte?"
             )
             add_to_conversation_log("model", response_text) 
-            return jsonify({"response": response_text, "response_type": "text"})
+            return chat_response({"response": response_text, "response_type": "text"}, "edificacion_externa")
 
 
     # --- Lógica para manejo específico de "Registro de Nacimiento" ---
@@ -676,19 +734,11 @@ def chat():
                 if score >= 1: 
                     relevant_birth_suggestions.append(proc)
         
-        suggestions_list_for_birth = []
-        seen_titles_for_birth = set()
-
-        if judicial_mandate_tupa and judicial_mandate_tupa['titulo'].lower().strip() not in seen_titles_for_birth:
-            suggestions_list_for_birth.append(judicial_mandate_tupa['titulo'])
-            seen_titles_for_birth.add(judicial_mandate_tupa['titulo'].lower().strip())
-        
-        for proc in relevant_birth_suggestions:
-            if proc.get('titulo') and proc['titulo'].lower().strip() not in seen_titles_for_birth:
-                suggestions_list_for_birth.append(proc['titulo'])
-                seen_titles_for_birth.add(proc['titulo'].lower().strip())
-            if len(suggestions_list_for_birth) >= 5: 
-                break
+        # El mandato judicial va primero; el resto sigue el orden de puntaje sin repetirlo
+        suggestions_list_for_birth = [judicial_mandate_tupa['titulo']] if judicial_mandate_tupa else []
+        suggestions_list_for_birth += [proc['titulo'] for proc in relevant_birth_suggestions
+                                       if proc.get('titulo') and proc is not judicial_mandate_tupa]
+        suggestions_list_for_birth = suggestions_list_for_birth[:5]
         
         response_text_prefix = (
             "Para la **inscripción de un recién nacido** y la obtención de su partida de nacimiento, "
@@ -700,15 +750,15 @@ def chat():
         if suggestions_list_for_birth:
             response_message = response_text_prefix + "\n\nSin embargo, he encontrado otros trámites relacionados que gestionamos en la municipalidad y que podrían ser de tu interés. ¿Te refieres a alguno de estos o quieres especificar más?"
             add_to_conversation_log("model", response_message + " Opciones: " + ", ".join(suggestions_list_for_birth)) 
-            return jsonify({
+            return chat_response({
                 "response_type": "suggestions",
                 "message": response_message,
                 "suggestions": suggestions_list_for_birth
-            })
+            }, "nacimiento_sugerencias")
         else:
             response_text = response_text_prefix + "\n¿Hay algún otro trámite municipal en el que pueda ayudarte?"
             add_to_conversation_log("model", response_text) 
-            return jsonify({"response": response_text, "response_type": "text"})
+            return chat_response({"response": response_text, "response_type": "text"}, "nacimiento_externo")
 
 
     # --- Lógica de Manejo de "Divorcio/Separación" (se mantiene consistente) ---
@@ -733,20 +783,12 @@ def chat():
             "separacion convencional" in user_message and "separacion convencional" in separation_tupa_found_in_db.get('titulo', '').lower()):
              response_text = format_procedure_details(separation_tupa_found_in_db)
              add_to_conversation_log("model", response_text) 
-             return jsonify({
+             return chat_response({
                  "response": response_text,
                  "response_type": "text"
-             })
+             }, "divorcio")
         else: 
-            suggestions_list = []
-            seen_titles = set()
-
-            for proc in relevant_separation_suggestions:
-                if proc.get('titulo') and proc['titulo'].lower().strip() not in seen_titles:
-                    suggestions_list.append(proc['titulo'])
-                    seen_titles.add(proc['titulo'].lower().strip())
-                if len(suggestions_list) >= 5:
-                    break
+            suggestions_list = [proc['titulo'] for proc in relevant_separation_suggestions if proc.get('titulo')][:5]
 
             base_message = (
                 "Estimado usuario, la Municipalidad Provincial de Puno gestiona trámites de **separación convencional** "
@@ -760,15 +802,15 @@ def chat():
             if suggestions_list:
                 response_message = base_message + "\n\nSi buscas información sobre los trámites que sí gestionamos, ¿te refieres a alguno de estos o quieres especificar más?"
                 add_to_conversation_log("model", response_message + " Opciones: " + ", ".join(suggestions_list)) 
-                return jsonify({
+                return chat_response({
                     "response_type": "suggestions",
                     "message": response_message,
                     "suggestions": suggestions_list
-                })
+                }, "divorcio_sugerencias")
             else:
                 response_text = base_message + "Si buscas información sobre la Separación Convencional y Divorcio Ulterior que se tramita aquí, por favor, indícalo."
                 add_to_conversation_log("model", response_text) 
-                return jsonify({"response": response_text, "response_type": "text"})
+                return chat_response({"response": response_text, "response_type": "text"}, "divorcio_informacion")
 
 
     # --- Lógica para cualquier otra consulta (General TUPA Search) ---
@@ -784,7 +826,7 @@ def chat():
             "Por favor, intenta preguntar sobre un procedimiento específico."
         )
         add_to_conversation_log("model", response_text)
-        return jsonify({"response": response_text, "response_type": "text"})
+        return chat_response({"response": response_text, "response_type": "text"}, "no_tupa")
 
     # Si se llegó aquí, significa que hay procedimientos TUPA con al menos una coincidencia débil (score >= NO_TUPA_THRESHOLD).
     top_score = all_scored_procedures[0][0]
@@ -806,25 +848,19 @@ def chat():
         response_text = format_procedure_details(first_proc)
         logging.info(f"Respuesta directa de TUPA (coincidencia fuerte general): {first_proc.get('titulo')}")
         add_to_conversation_log("model", response_text) 
-        return jsonify({"response": response_text, "response_type": "text"})
+        return chat_response({"response": response_text, "response_type": "text"}, "general_directa")
     else:
-        suggested_titles = []
-        seen_titles = set()
-        for score, proc in all_scored_procedures: 
-            if score >= MIN_SUGGESTION_SCORE and proc.get('titulo') and proc['titulo'].lower().strip() not in seen_titles:
-                suggested_titles.append(proc['titulo'])
-                seen_titles.add(proc['titulo'].lower().strip())
-            if len(suggested_titles) >= 5: 
-                break
+        suggested_titles = [proc['titulo'] for score, proc in all_scored_procedures
+                            if score >= MIN_SUGGESTION_SCORE and proc.get('titulo')][:5]
         
         if suggested_titles:
             response_message = "He encontrado varias opciones que podrían ser relevantes para tu búsqueda. ¿Te refieres a alguna de estas o quieres reformular tu pregunta para obtener resultados más específicos?"
             add_to_conversation_log("model", response_message + " Opciones: " + ", ".join(suggested_titles)) 
-            return jsonify({
+            return chat_response({
                 "response_type": "suggestions",
                 "message": response_message,
                 "suggestions": suggested_titles
-            })
+            }, "general_sugerencias")
         else:
             # Si se llega aquí, significa que hubo algunas coincidencias TUPA (score >= NO_TUPA_THRESHOLD),
             # pero no lo suficientemente fuertes para un match directo (no >= STRONG_MATCH_SCORE_THRESHOLD)
@@ -838,12 +874,59 @@ def chat():
                 "Recuerda que solo puedo brindarte información sobre trámites municipales."
             )
             add_to_conversation_log("model", response_text)
-            return jsonify({"response": response_text, "response_type": "text"})
+            return chat_response({"response": response_text, "response_type": "text"}, "general_sin_coincidencia")
     
     # El bloque de fallback a Gemini ha sido eliminado, ya que todas las rutas
     # deberían ser manejadas por la lógica de búsqueda TUPA local y los mensajes
     # de "fuera de dominio".
 
+def respond_requirements_query(documents):
+    """Lista los procedimientos cuyos requisitos mencionan todos los documentos pedidos."""
+    procs = g.tenant.passage_index.procedures_requiring(documents)
+    documents_text = ", ".join(documents)
+    if not procs:
+        response_text = (
+            f"No encontré trámites cuyos requisitos mencionen: {documents_text}. "
+            "Prueba con el nombre del documento tal como aparece en el TUPA (por ejemplo, \"copia de DNI\")."
+        )
+        add_to_conversation_log("model", response_text)
+        return chat_response({"response": response_text, "response_type": "text"}, "requisitos_sin_coincidencia")
+
+    suggestions = [proc['titulo'] for proc in procs if proc.get('titulo')][:MAX_REQUIREMENT_SUGGESTIONS]
+    if len(procs) == 1:
+        response_message = f"Encontré 1 trámite que pide {documents_text} entre sus requisitos."
+    else:
+        response_message = f"Encontré {len(procs)} trámites que piden {documents_text} entre sus requisitos."
+    if len(procs) > len(suggestions):
+        response_message += f" Te muestro los primeros {len(suggestions)}."
+    response_message += " ¿Sobre cuál quieres más información?"
+    add_to_conversation_log("model", response_message + " Opciones: " + ", ".join(suggestions))
+    return chat_response({
+        "response_type": "suggestions",
+        "message": response_message,
+        "suggestions": suggestions
+    }, "requisitos_agregados")
+
+def respond_degraded(user_message):
+    """
+    Respuesta de /chat bajo sobrecarga: busca el mensaje directamente entre las claves
+    de título y código del corpus del tenant, sin pasar por el cálculo de puntuaciones.
+    """
+    proc = g.tenant.procedures.get(user_message.strip())
+    if proc:
+        logging.info(f"Modo degradado: coincidencia directa con '{proc.get('titulo')}'.")
+        response_text = format_procedure_details(proc)
+        add_to_conversation_log("model", response_text)
+        return chat_response({"response": response_text, "response_type": "text"}, "degradado_directa")
+
+    response_text = (
+        "En este momento el asistente está atendiendo muchas consultas. "
+        "Por favor, escribe el **título exacto** o el **código** del procedimiento TUPA, "
+        "o vuelve a intentarlo en unos segundos."
+    )
+    add_to_conversation_log("model", response_text)
+    return chat_response({"response": response_text, "response_type": "text"}, "degradado_sin_coincidencia")
+
 def format_procedure_details(matching_procedure):
     """
     Formatea los detalles de un procedimiento TUPA en un texto Markdown,
@@ -914,4 +997,4 @@ def format_procedure_details(matching_procedure):
     return "\n".join(response_parts)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
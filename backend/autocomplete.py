@@ -0,0 +1,133 @@
+import re
+import unicodedata
+from bisect import bisect_left
+
+# --- AUTOCOMPLETADO DE PROCEDIMIENTOS TUPA ---
+# Arreglo ordenado de claves normalizadas (sin tildes) + bisect. Cada título se
+# indexa desde el inicio de cada palabra, junto con su código y los sinónimos
+# curados. Para los prefijos cortos (los de rangos más grandes) las mejores
+# completaciones se precalculan al construir el índice.
+
+# Sinónimos de uso común -> frase que aparece en los títulos del TUPA
+AUTOCOMPLETE_SYNONYMS = {
+    "brevete": "licencia de conducir",
+    "pase de conducir": "licencia de conducir",
+    "mototaxi": "vehiculos menores motorizados",
+    "boda": "matrimonio civil",
+    "casarse": "matrimonio civil",
+    "divorcio": "separacion convencional y divorcio ulterior",
+    "convivencia": "uniones de hecho",
+    "bodega": "licencia provisional de funcionamiento para bodegas",
+    "abrir negocio": "licencia de funcionamiento",
+    "autovaluo": "impuesto predial",
+    "partida de nacimiento": "inscripcion de nacimientos",
+    "construir casa": "licencia de edificacion",
+    "itse": "inspeccion tecnica de seguridad",
+    "perro": "canes",
+}
+
+# Rango de las coincidencias: menor es mejor
+RANK_EXACT_START = 0  # código, sinónimo o inicio del título
+RANK_WORD_START = 1   # inicio de una palabra interna del título
+
+
+def fold_text(text):
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios simples."""
+    text = unicodedata.normalize('NFD', text.lower())
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def fold_words(text):
+    """
+    Palabras de `fold_text` para textos largos (requisitos, sedes): descarta los
+    diacríticos codificando a ASCII en lugar de recorrer carácter por carácter.
+    Solo difiere en símbolos no ASCII sin tilde (º, °), que aquí se descartan.
+    """
+    text = unicodedata.normalize('NFD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^\w\s]', ' ', text).split()
+
+
+class AutocompleteIndex:
+    """
+    Índice de completaciones por prefijo sobre títulos, códigos y sinónimos.
+    `complete(q)` retorna hasta `max_results` procedimientos como
+    {"titulo": ..., "codigo": ...}.
+    """
+
+    def __init__(self, procedures, max_results=8, precompute_depth=3, synonyms=AUTOCOMPLETE_SYNONYMS):
+        self.max_results = max_results
+        self.precompute_depth = precompute_depth
+
+        # tupa_procedures tiene varias claves por procedimiento; se indexa cada uno una vez
+        self._procs = []
+        seen_ids = set()
+        for proc in procedures.values():
+            if id(proc) not in seen_ids and proc.get('titulo'):
+                seen_ids.add(id(proc))
+                self._procs.append(proc)
+
+        self._folded_titles = [fold_text(p['titulo']) for p in self._procs]
+        self._results = [{"titulo": p['titulo'], "codigo": p.get('codigo', '')} for p in self._procs]
+
+        entries = []
+        for idx, folded in enumerate(self._folded_titles):
+            # El título completo tiene precedencia sobre los títulos más largos que lo contienen
+            length = len(folded)
+            words = folded.split(' ')
+            position = 0
+            for word_number, word in enumerate(words):
+                rank = RANK_EXACT_START if word_number == 0 else RANK_WORD_START
+                entries.append((folded[position:], (rank, length, idx)))
+                position += len(word) + 1
+            code = fold_text(self._procs[idx].get('codigo', ''))
+            if code:
+                entries.append((code, (RANK_EXACT_START, 0, idx)))
+
+        for synonym, target in synonyms.items():
+            synonym, target = fold_text(synonym), fold_text(target)
+            for idx, folded in enumerate(self._folded_titles):
+                if target in folded:
+                    entries.append((synonym, (RANK_EXACT_START, len(folded), idx)))
+
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ranks = [rank for _, rank in entries]
+
+        self._precomputed = {}
+        for key in set(self._keys):
+            for depth in range(1, min(precompute_depth, len(key)) + 1):
+                prefix = key[:depth]
+                if prefix not in self._precomputed:
+                    self._precomputed[prefix] = self._scan(prefix)
+
+    def _scan(self, prefix, limit=None, required_words=()):
+        """Recorre el rango de claves que empiezan con `prefix` y retorna los mejores índices."""
+        limit = limit or self.max_results
+        best = {}
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            rank = self._ranks[i]
+            idx = rank[2]
+            if (idx not in best or rank < best[idx]) and \
+               all(w in self._folded_titles[idx] for w in required_words):
+                best[idx] = rank
+            i += 1
+        return [idx for _, idx in sorted((rank, idx) for idx, rank in best.items())[:limit]]
+
+    def complete(self, query, limit=None):
+        prefix = fold_text(query)
+        if not prefix:
+            return []
+        limit = max(1, min(limit or self.max_results, self.max_results))
+
+        if len(prefix) <= self.precompute_depth:
+            indices = self._precomputed.get(prefix, [])[:limit]
+        else:
+            indices = self._scan(prefix, limit)
+            if not indices and ' ' in prefix:
+                # "licencia func": la última palabra como prefijo, el resto debe aparecer en el título
+                *previous, last = prefix.split(' ')
+                indices = self._scan(last, limit, required_words=previous)
+        return [self._results[idx] for idx in indices]
@@ -0,0 +1,109 @@
+"""
+Benchmark del índice de pasajes: construcción, memoria y latencia de las consultas
+por requisito ("¿qué trámites piden copia de DNI y SOAT?") y de búsqueda de pasajes
+("¿dónde pago en caja?"), frente a recorrer todas las secciones en cada consulta.
+
+Uso (desde backend/):
+    python benchmarks/bench_passages.py --repeat 200
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from autocomplete import fold_text
+from near_duplicates import canonicalize_procedures
+from passage_index import (PASSAGE_SECTIONS, PassageIndex, collapse_acronyms, passage_tokens, section_lines,
+                           split_documents)
+from tenants import estimate_size
+from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+
+REQUIREMENT_QUERIES = ["copia de dni y soat", "dni", "tarjeta de propiedad", "plano de ubicacion, memoria descriptiva",
+                       "certificado de inspeccion tecnica", "partida registral"]
+PASSAGE_QUERIES = ["donde pago en caja", "horario sede ramis", "mesa de partes virtual", "pago en banco de la nacion"]
+
+
+def scan_procedures_requiring(procs, documents):
+    """Línea base: recorre todos los requisitos normalizando el texto en cada consulta."""
+    wanted = [passage_tokens(d) for d in documents]
+    result = []
+    for proc in procs:
+        lines = [fold_text(collapse_acronyms(line)) for line in proc.get('requisitos', [])]
+        if all(any(all(token in line for token in tokens) for line in lines) for tokens in wanted if tokens):
+            result.append(proc)
+    return result
+
+
+def scan_passages(procs, query, limit=10):
+    tokens = set(passage_tokens(query))
+    scored = []
+    for proc in procs:
+        for section in PASSAGE_SECTIONS:
+            for line in section_lines(proc, section):
+                folded = fold_text(collapse_acronyms(line))
+                score = sum(1 for token in tokens if token in folded)
+                if score:
+                    scored.append((score, line))
+    scored.sort(key=lambda item: -item[0])
+    return scored[:limit]
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia y memoria del índice de pasajes.")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Directorio con los archivos TUPA")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por consulta")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    _, procs, _ = canonicalize_procedures(load_tupa_data(args.data_dir))
+
+    start = time.perf_counter()
+    index = PassageIndex(procs)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    index_bytes = estimate_size(index) - estimate_size(procs)
+    naive_bytes = estimate_size([
+        {"procedimiento": i, "seccion": section, "texto": line.strip()}
+        for i, proc in enumerate(procs) for section in PASSAGE_SECTIONS for line in section_lines(proc, section)
+    ])
+    print(f"Índice: {len(index)} pasajes, {len(index.strings)} textos distintos, {len(index.tokens)} tokens; "
+          f"construcción {build_ms:.1f} ms")
+    print(f"Memoria adicional: {index_bytes / 1024:.0f} KiB (lista de dicts con copias del texto: "
+          f"{naive_bytes / 1024:.0f} KiB)\n")
+
+    print(f"{'consulta':<48} {'resultados':>10} {'indice_p50_us':>14} {'indice_p99_us':>14} {'recorrido_p50_us':>17}")
+    for query in REQUIREMENT_QUERIES:
+        documents = split_documents(query)
+        found = index.procedures_requiring(documents)
+        baseline = scan_procedures_requiring(procs, documents)
+        if {id(p) for p in found} != {id(p) for p in baseline}:
+            print(f"  aviso: el índice y el recorrido difieren para '{query}' "
+                  f"({len(found)} vs {len(baseline)}: el recorrido compara subcadenas, el índice palabras o prefijos)")
+        p50, p99 = measure(lambda: index.procedures_requiring(documents), args.repeat)
+        scan_p50, _ = measure(lambda: scan_procedures_requiring(procs, documents), max(args.repeat // 10, 5))
+        print(f"{'requisitos: ' + query:<48} {len(found):>10} {p50 * 1000:>14.1f} {p99 * 1000:>14.1f} {scan_p50 * 1000:>17.1f}")
+
+    for query in PASSAGE_QUERIES:
+        results = index.search(query)
+        p50, p99 = measure(lambda: index.search(query), args.repeat)
+        scan_p50, _ = measure(lambda: scan_passages(procs, query), max(args.repeat // 10, 5))
+        print(f"{'pasajes: ' + query:<48} {len(results):>10} {p50 * 1000:>14.1f} {p99 * 1000:>14.1f} {scan_p50 * 1000:>17.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Benchmark de la recuperación semántica: construcción, memoria, carga memory-mapped y
+latencia de la búsqueda exacta frente a la aproximada (particiones k-means, con varios
+valores de `probes`), con su recall@k respecto a la exacta, sobre el corpus real (1x)
+y sobre uno sintético de N veces su tamaño.
+
+El corpus sintético combina mitades de títulos y de descripciones de procedimientos
+distintos: vectores diferentes entre sí (sin empates que vuelvan arbitrario el top-k
+exacto) pero con el mismo vocabulario.
+Las consultas de muestra son palabras tomadas de un procedimiento (acierto@k = ese
+procedimiento aparece entre los k primeros de la búsqueda exacta; en el corpus
+sintético baja porque otras filas comparten la mitad de su texto).
+
+Uso (desde backend/):
+    python benchmarks/bench_semantic.py --scales 1 50 --probes 4 8 16
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from near_duplicates import canonicalize_procedures
+from semantic_index import ClusterIndex, SemanticIndex, numpy_available, semantic_words
+from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+
+NATURAL_QUERIES = ["me voy a casar", "quiero abrir una bodega", "tengo un perro", "quiero construir mi casa",
+                   "pagar impuesto de mi casa", "permiso para vender comida en la calle"]
+
+
+def mix_halves(text_a, text_b):
+    words_a, words_b = text_a.split(), text_b.split()
+    return " ".join(words_a[:(len(words_a) + 1) // 2] + words_b[len(words_b) // 2:])
+
+
+def synthetic_corpus(procs, scale, rng):
+    """El corpus original más (scale - 1) copias recombinadas."""
+    corpus = list(procs)
+    for _ in range(scale - 1):
+        for proc in procs:
+            other, a, b = rng.sample(procs, 3)
+            corpus.append({
+                "titulo": mix_halves(proc.get('titulo', ''), other.get('titulo', '')),
+                "descripcion": mix_halves(a.get('descripcion', ''), b.get('descripcion', '')),
+            })
+    return corpus
+
+
+def sample_queries(procs, count, rng):
+    """(consulta, índice del procedimiento de origen): 3 a 5 palabras de su título y descripción."""
+    queries = []
+    while len(queries) < count:
+        proc_id = rng.randrange(len(procs))
+        words = semantic_words(procs[proc_id].get('titulo', '') + " " + procs[proc_id].get('descripcion', ''))
+        if len(words) >= 3:
+            queries.append((" ".join(rng.sample(words, min(len(words), rng.randint(3, 5)))), proc_id))
+    return queries
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(int(len(samples) * 0.99) - 1, 0)]
+
+
+def run_scale(procs, scale, args, rng):
+    corpus = synthetic_corpus(procs, scale, rng)
+    start = time.perf_counter()
+    index = SemanticIndex.build(corpus, args.dim)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        start = time.perf_counter()
+        mapped = SemanticIndex.load_or_build(corpus, tmp, args.dim)
+        load_ms = (time.perf_counter() - start) * 1000
+        assert mapped.mmapped
+        del mapped
+
+    queries = sample_queries(corpus, args.queries, rng) + [(q, None) for q in NATURAL_QUERIES]
+    vectors = [(index.embed(q), origin) for q, origin in queries]
+    start = time.perf_counter()
+    index.ann = ClusterIndex(index.matrix)
+    kmeans_ms = (time.perf_counter() - start) * 1000
+
+    exact_us, exact_ids, hits = [], [], []
+    for vector, origin in vectors:
+        start = time.perf_counter()
+        ids = {i for i, _ in index.search_ids(vector, args.k, "exact")}
+        exact_us.append((time.perf_counter() - start) * 1e6)
+        exact_ids.append(ids)
+        if origin is not None:
+            hits.append(origin in ids)
+    p50, p99 = percentiles(exact_us)
+    rows = [{"metodo": "exacta", "latencia_p50_us": p50, "latencia_p99_us": p99, "recall": 1.0,
+             "candidatos": len(corpus)}]
+
+    for probes in args.probes:
+        ann_us, recalls, candidates = [], [], []
+        for (vector, _), expected in zip(vectors, exact_ids):
+            start = time.perf_counter()
+            found = {i for i, _ in index.search_ids(vector, args.k, "ann", probes)}
+            ann_us.append((time.perf_counter() - start) * 1e6)
+            if expected:
+                recalls.append(len(expected & found) / len(expected))
+            candidates.append(len(index.ann.candidates(vector, probes)))
+        p50, p99 = percentiles(ann_us)
+        rows.append({"metodo": f"ann probes={probes}", "latencia_p50_us": p50, "latencia_p99_us": p99,
+                     "recall": statistics.mean(recalls), "candidatos": statistics.mean(candidates)})
+
+    print(f"{scale}x: {len(corpus)} filas, matriz {index.matrix.nbytes / (1024 * 1024):.1f} MiB, "
+          f"construcción {build_ms:.0f} ms, carga memory-mapped {load_ms:.1f} ms, "
+          f"k-means ({len(index.ann.centroids)} particiones) {kmeans_ms:.0f} ms, "
+          f"acierto@{args.k} de la exacta {statistics.mean(hits):.2f}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia y recall de la recuperación semántica.")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Directorio con los archivos TUPA")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 50], help="Tamaños del corpus (múltiplos)")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas de muestra por escala")
+    parser.add_argument("--k", type=int, default=10, help="Resultados por consulta")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimensiones de los vectores")
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16], help="Particiones revisadas por consulta")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not numpy_available():
+        print("NumPy no está instalado.", file=sys.stderr)
+        return 1
+
+    logging.disable(logging.CRITICAL)
+    _, procs, _ = canonicalize_procedures(load_tupa_data(args.data_dir))
+    rng = random.Random(args.seed)
+
+    columns = ["metodo", "latencia_p50_us", "latencia_p99_us", "recall", "candidatos"]
+    for scale in args.scales:
+        rows = run_scale(procs, scale, args, rng)
+        print(f"{columns[0]:<18}" + " ".join(f"{c:>16}" for c in columns[1:]))
+        for row in rows:
+            print(f"{row['metodo']:<18}" + " ".join(f"{row[c]:>16.2f}" for c in columns[1:]))
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Perfil de arranque: tiempo de importación por módulo (python -X importtime) y
+tiempo hasta la primera respuesta de /chat con cada modo de precarga del corpus.
+Cada medición se hace en un proceso nuevo para partir siempre en frío.
+
+Uso (desde backend/):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --record startup_bench.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Se ejecuta en un proceso hijo; imprime las fases en JSON
+FIRST_REQUEST_SNIPPET = """
+import json, logging, os, sys, time
+os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+logging.disable(logging.CRITICAL)
+app = create_app(warm_up=sys.argv[1])
+created = time.perf_counter()
+client = app.test_client()
+client.post('/chat', json={'message': 'licencia de funcionamiento'})
+first_chat = time.perf_counter()
+while client.get('/ready').status_code != 200:
+    time.sleep(0.001)
+ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_chat_ms": (first_chat - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+}))
+"""
+
+
+def import_profile():
+    """Retorna [(módulo, propio_us, acumulado_us)] de `import app`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def first_request(mode):
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST_SNIPPET, mode],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfil de importación y tiempo hasta la primera petición.")
+    parser.add_argument("--runs", type=int, default=3, help="Procesos por modo de precarga")
+    parser.add_argument("--top", type=int, default=12, help="Módulos a listar por tiempo acumulado")
+    parser.add_argument("--record", help="Añade el resumen como línea JSON a este archivo")
+    args = parser.parse_args(argv)
+
+    rows = import_profile()
+    app_total = next((cumulative for name, _, cumulative in rows if name == 'app'), 0)
+    print(f"import app: {app_total / 1000:.1f} ms")
+    print(f"{'módulo':<40} {'propio_ms':>10} {'acumulado_ms':>13}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{name:<40} {self_us / 1000:>10.1f} {cumulative_us / 1000:>13.1f}")
+
+    summary = {"ts": time.time(), "import_app_ms": app_total / 1000, "modes": {}}
+    print(f"\n{'precarga':<11} {'import_ms':>10} {'create_ms':>10} {'1a_chat_ms':>11} {'ready_ms':>9}")
+    for mode in ("lazy", "background", "sync"):
+        runs = [first_request(mode) for _ in range(args.runs)]
+        medians = {key: statistics.median(r[key] for r in runs)
+                   for key in ("import_ms", "create_app_ms", "first_chat_ms", "ready_ms")}
+        summary["modes"][mode] = medians
+        print(f"{mode:<11} {medians['import_ms']:>10.1f} {medians['create_app_ms']:>10.1f} "
+              f"{medians['first_chat_ms']:>11.1f} {medians['ready_ms']:>9.1f}")
+
+    if args.record:
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary) + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
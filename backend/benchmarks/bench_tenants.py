@@ -0,0 +1,85 @@
+"""
+Benchmark de tenants: memoria residente por municipalidad y latencia de la primera
+petición (carga perezosa) frente a las siguientes.
+
+Uso (desde backend/):
+    python benchmarks/bench_tenants.py --tenants 6 --max-resident 4
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tupa_loader import TUPA_DATA_DIR
+from tenants import Tenant, TenantRegistry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Huella por tenant y latencia de primera petición.")
+    parser.add_argument("--tenants", type=int, default=6, help="Número de tenants simulados")
+    parser.add_argument("--max-resident", type=int, default=4, help="Tope de tenants residentes")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Corpus que usa cada tenant simulado")
+    parser.add_argument("--repeat", type=int, default=50, help="Peticiones en caliente por tenant")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+
+    # Todos los tenants simulados comparten el mismo corpus pero lo cargan por separado
+    tenant_ids = [f"muni{i}" for i in range(args.tenants)]
+    registry = TenantRegistry({t: args.data_dir for t in tenant_ids}, max_resident=args.max_resident)
+
+    from app import create_app
+    app = create_app(warm_up="lazy")
+    app.extensions['tupa'].tenant_registry = registry
+    client = app.test_client()
+
+    print(f"{'tenant':<8} {'carga_ms':>9} {'1a_chat_ms':>11} {'chat_p50_ms':>12} "
+          f"{'estimado_KiB':>13}")
+    for tenant_id in tenant_ids:
+        start = time.perf_counter()
+        tenant = registry.get(tenant_id)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        # Mensajes distintos en cada repetición para no medir la caché de respuestas
+        start = time.perf_counter()
+        client.post(f'/t/{tenant_id}/chat', json={'message': 'licencia de funcionamiento'},
+                    environ_base={'REMOTE_ADDR': f'10.0.0.{tenant_ids.index(tenant_id)}'})
+        first_chat_ms = (time.perf_counter() - start) * 1000
+
+        warm = []
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            client.post(f'/t/{tenant_id}/chat', json={'message': f'certificado {i}'},
+                        environ_base={'REMOTE_ADDR': f'10.1.{i}.1'})
+            warm.append((time.perf_counter() - start) * 1000)
+
+        print(f"{tenant_id:<8} {load_ms:>9.1f} {first_chat_ms:>11.2f} {statistics.median(warm):>12.2f} "
+              f"{tenant.footprint_bytes / 1024:>13.0f}")
+
+    # Contraste de la estimación con la memoria realmente asignada (tracemalloc ralentiza la carga)
+    tracemalloc.start()
+    sample = Tenant("muestra", args.data_dir, response_cache_size=0)
+    traced_kib = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    print(f"\nHuella medida con tracemalloc: {traced_kib:.0f} KiB (estimada: {sample.footprint_bytes / 1024:.0f} KiB)")
+
+    resident = registry.resident_tenants()
+    print(f"Residentes: {[t.tenant_id for t in resident]} "
+          f"(~{registry.resident_bytes() / 1024 / 1024:.1f} MiB estimados)")
+
+    # Un tenant expulsado vuelve a pagar la carga en su siguiente petición
+    evicted = [t for t in tenant_ids if t not in {r.tenant_id for r in resident}]
+    if evicted:
+        start = time.perf_counter()
+        registry.get(evicted[0])
+        print(f"Recarga de '{evicted[0]}' tras expulsión: {(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
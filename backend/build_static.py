@@ -0,0 +1,146 @@
+"""
+Genera frontend/dist: versión del frontend con nombres de archivo con huella de
+contenido (hash), imágenes optimizadas y copias precomprimidas (.gz / .br) para
+que Flask las sirva desde el mismo origen que la API con caché inmutable.
+
+Uso:
+    python build_static.py            # escribe ../frontend/dist
+    python build_static.py --out DIR
+
+Pillow (WebP) y brotli (.br) son opcionales: sin ellos las imágenes se copian
+tal cual y solo se generan archivos .gz.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+DEFAULT_OUT_DIR = os.path.join(FRONTEND_DIR, 'dist')
+
+# Las imágenes se muestran como avatares de 32-40 px; 160 px cubre pantallas de alta densidad
+MAX_IMAGE_SIZE = 160
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg')
+# No vale la pena comprimir archivos muy pequeños
+MIN_COMPRESS_BYTES = 512
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def fingerprinted_name(logical_path, data):
+    root, ext = os.path.splitext(logical_path)
+    return f"{root}.{content_hash(data)}{ext}"
+
+
+def optimize_image(path):
+    """Reduce la imagen y la convierte a WebP. Retorna (bytes, extensión)."""
+    with open(path, 'rb') as f:
+        original = f.read()
+    if Image is None:
+        return original, os.path.splitext(path)[1]
+
+    with Image.open(path) as im:
+        im.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
+        buffer = io.BytesIO()
+        im.save(buffer, format='WEBP', quality=85, method=6)
+    optimized = buffer.getvalue()
+    if len(optimized) >= len(original):
+        return original, os.path.splitext(path)[1]
+    return optimized, '.webp'
+
+
+def write_with_precompressed(path, data):
+    """Escribe el archivo y, si es texto, sus variantes .gz y .br."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS) or len(data) < MIN_COMPRESS_BYTES:
+        return
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def rewrite_references(text, manifest):
+    """Reemplaza cada ruta lógica ('assets/logo.jpg', 'script.js', ...) por su versión con hash."""
+    # Las rutas más largas primero para no reemplazar parcialmente 'assets/x.png' con 'x.png'
+    for logical in sorted(manifest, key=len, reverse=True):
+        text = re.sub(r'(?<![\w/.-])' + re.escape(logical) + r'(?![\w.-])', manifest[logical], text)
+    return text
+
+
+def build(out_dir=DEFAULT_OUT_DIR):
+    """
+    Construye el frontend en `out_dir` y retorna el manifiesto
+    {ruta lógica: ruta servida}.
+    """
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    static_dir = os.path.join(out_dir, 'static')
+    manifest = {}
+
+    # 1. Imágenes: optimizadas y con hash
+    assets_dir = os.path.join(FRONTEND_DIR, 'assets')
+    for filename in sorted(os.listdir(assets_dir)):
+        data, ext = optimize_image(os.path.join(assets_dir, filename))
+        logical = f"assets/{filename}"
+        served = fingerprinted_name(f"assets/{os.path.splitext(filename)[0]}{ext}", data)
+        write_with_precompressed(os.path.join(static_dir, served), data)
+        manifest[logical] = f"static/{served}"
+
+    # 2. CSS y JS: se reescriben sus referencias antes de calcular su propio hash
+    for filename in ('style.css', 'script.js'):
+        with open(os.path.join(FRONTEND_DIR, filename), 'r', encoding='utf-8') as f:
+            data = rewrite_references(f.read(), manifest).encode('utf-8')
+        served = fingerprinted_name(filename, data)
+        write_with_precompressed(os.path.join(static_dir, served), data)
+        manifest[filename] = f"static/{served}"
+
+    # 3. index.html no lleva hash: se sirve sin caché y apunta a las versiones con hash
+    with open(os.path.join(FRONTEND_DIR, 'index.html'), 'r', encoding='utf-8') as f:
+        index_html = rewrite_references(f.read(), manifest).encode('utf-8')
+    write_with_precompressed(os.path.join(out_dir, 'index.html'), index_html)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera el frontend con huellas de contenido y precomprimido.")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="Directorio de salida")
+    args = parser.parse_args(argv)
+
+    if Image is None:
+        print("Aviso: Pillow no está instalado; las imágenes se copian sin optimizar.", file=sys.stderr)
+    if brotli is None:
+        print("Aviso: brotli no está instalado; solo se generan archivos .gz.", file=sys.stderr)
+
+    manifest = build(os.path.abspath(args.out))
+    for logical, served in manifest.items():
+        print(f"{logical} -> {served}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Diagnóstico de memoria y asignaciones (opcional, MEMORY_DIAGNOSTICS=1).
+
+Con el diagnóstico activado, create_app inicia tracemalloc antes de cargar el
+corpus y cada petición registra cuánta memoria asignó. GET /diagnostics/memory
+reporta:
+  - memoria trazada atribuida por archivo: el módulo del backend que hizo cada
+    asignación (las respuestas en caché y el historial se construyen en app.py y
+    quedan atribuidos a "app", no a las cachés ni a las sesiones);
+  - tamaño medido directamente de las estructuras vivas: corpus, índices y caché de
+    respuestas de cada tenant (con los bytes que contabiliza la propia LRUCache),
+    historial de conversación, limitador de tasa, cola del registro de consultas y
+    caché de n-gramas de la recuperación semántica;
+  - histogramas por petición del pico transitorio, los bytes retenidos y los
+    bloques retenidos netos (bloques vivos al terminar menos al empezar: lo que la
+    petición dejó asignado, no cuántas asignaciones hizo; tracemalloc y el
+    asignador solo exponen bloques vivos), con promedios por rama de /chat;
+  - los sitios (archivo:línea) que más memoria retienen.
+
+Las medidas por petición empiezan después de parsear el cuerpo JSON (Werkzeug
+usa un búfer fijo de 64 KiB) y usan contadores globales del proceso: con peticiones
+simultáneas se mezclan, así que conviene medir con tráfico secuencial (este script).
+
+Uso:
+    python memory_diagnostics.py [--queries-file query_log.jsonl] [--repeat 3] [--top 15] [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+
+from semantic_index import word_hashes
+from tenants import estimate_size
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulo del backend que asigna -> grupo al que se atribuye la memoria trazada. Es una
+# atribución por archivo, no por estructura: lo que app.py construye y otra estructura
+# retiene (respuestas en caché, historial) cuenta en "app"; structure_report() mide esas
+# estructuras directamente.
+SUBSYSTEM_MODULES = {
+    "tupa_loader.py": "corpus",
+    "near_duplicates.py": "corpus",
+    "autocomplete.py": "indices",
+    "passage_index.py": "indices",
+    "search_bundle.py": "indices",
+    "semantic_index.py": "indices",
+    "tenants.py": "tenants",
+    "admission.py": "limitador",
+    "query_log.py": "registro_consultas",
+    "app.py": "app",
+}
+
+# Límites superiores de las casillas de los histogramas por petición
+BYTES_BOUNDS = [1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+BLOCKS_BOUNDS = [16, 64, 256, 1024, 4096, 16384, 65536]
+
+DEFAULT_DIAGNOSTIC_QUERIES = [
+    "licencia de funcionamiento", "brevete", "licencia de edificacion", "partida de nacimiento",
+    "divorcio", "certificado", "matrimonio civil", "que tramites piden copia de dni y soat",
+    "cual es la capital de francia", "constancia de posesion", "itse", "impuesto predial",
+]
+
+
+class Histogram:
+    """Conteo por casillas con límites fijos; los valores negativos (memoria liberada) caen en la primera."""
+
+    def __init__(self, bounds, scale=1, unit=""):
+        self.bounds = bounds
+        self.labels, lower = [], 0
+        for bound in bounds:
+            self.labels.append(f"{lower // scale}-{bound // scale}{unit}")
+            lower = bound
+        self.labels.append(f">{lower // scale}{unit}")
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        bucket = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        self.counts[bucket] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        n = sum(self.counts)
+        return {
+            # Lista de pares y no dict: jsonify ordena las claves alfabéticamente
+            "casillas": [[label, count] for label, count in zip(self.labels, self.counts)],
+            "promedio": round(self.total / n) if n else 0,
+            "max": self.max,
+        }
+
+
+class MemoryDiagnostics:
+    """Estado del diagnóstico: histogramas por petición y acceso a instantáneas de tracemalloc."""
+
+    def __init__(self, frames=16):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.peak = Histogram(BYTES_BOUNDS, 1024, " KiB")
+        self.retained = Histogram(BYTES_BOUNDS, 1024, " KiB")
+        self.net_retained_blocks = Histogram(BLOCKS_BOUNDS)
+        self.by_branch = {}
+
+    def start_request(self):
+        """Marca el inicio de una petición; retorna el estado a pasar a `finish_request`."""
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0], sys.getallocatedblocks()
+
+    def finish_request(self, started, branch):
+        current, peak = tracemalloc.get_traced_memory()
+        start_bytes, start_blocks = started
+        peak_bytes = peak - start_bytes
+        retained_bytes = current - start_bytes
+        # Neto: bloques asignados menos liberados durante la petición (no el total de asignaciones)
+        net_retained_blocks = sys.getallocatedblocks() - start_blocks
+        with self._lock:
+            self.requests += 1
+            self.peak.add(peak_bytes)
+            self.retained.add(retained_bytes)
+            self.net_retained_blocks.add(net_retained_blocks)
+            count, peak_sum, retained_sum = self.by_branch.get(branch, (0, 0, 0))
+            self.by_branch[branch] = (count + 1, peak_sum + peak_bytes, retained_sum + retained_bytes)
+
+    def request_report(self):
+        with self._lock:
+            return {
+                "peticiones": self.requests,
+                "pico_transitorio": self.peak.to_dict(),
+                "bytes_retenidos": self.retained.to_dict(),
+                "bloques_retenidos_netos": self.net_retained_blocks.to_dict(),
+                "por_rama": {
+                    branch: {"peticiones": count, "pico_promedio_bytes": round(peak_sum / count),
+                             "retenido_promedio_bytes": round(retained_sum / count)}
+                    for branch, (count, peak_sum, retained_sum) in sorted(self.by_branch.items())
+                },
+            }
+
+    def snapshot_report(self, top=15):
+        """Memoria trazada atribuida por archivo y principales sitios de asignación."""
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+        by_file = {}
+        for stat in snapshot.statistics('traceback'):
+            group = subsystem_for_traceback(stat.traceback)
+            size, count = by_file.get(group, (0, 0))
+            by_file[group] = (size + stat.size, count + stat.count)
+
+        top_sites = []
+        for stat in snapshot.statistics('lineno')[:top]:
+            frame = stat.traceback[-1]
+            top_sites.append({
+                "sitio": f"{os.path.relpath(frame.filename, BACKEND_DIR)}:{frame.lineno}",
+                "archivo": subsystem_for_traceback(stat.traceback),
+                "bytes": stat.size,
+                "bloques": stat.count,
+            })
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "actual_bytes": current,
+            "pico_bytes": peak,
+            "atribucion_por_archivo": {
+                name: {"bytes": size, "bloques": count}
+                for name, (size, count) in sorted(by_file.items(), key=lambda item: -item[1][0])
+            },
+            "principales_sitios": top_sites,
+        }
+
+
+_backend_module_by_filename = {}
+
+
+def backend_module(filename):
+    """Nombre del módulo si el archivo está en backend/, None si no (resultado memorizado)."""
+    module = _backend_module_by_filename.get(filename, False)
+    if module is False:
+        path = os.path.abspath(filename)
+        module = os.path.basename(path) if os.path.dirname(path) == BACKEND_DIR else None
+        _backend_module_by_filename[filename] = module
+    return module
+
+
+def subsystem_for_traceback(traceback):
+    """Grupo del frame más reciente que pertenece al backend; 'otros' si no hay ninguno."""
+    for frame in reversed(traceback):
+        module = backend_module(frame.filename)
+        if module:
+            return SUBSYSTEM_MODULES.get(module, "otros")
+    return "otros"
+
+
+def structure_report(tupa, conversation_log):
+    """
+    Tamaño medido de las estructuras vivas. Los objetos compartidos se cuentan una
+    sola vez, en el primer subsistema que los referencia (corpus antes que índices).
+    """
+    seen = set()
+
+    def size_of(*objs):
+        # Objeto por objeto: una lista temporal podría reutilizar el id() de otra ya contada
+        return sum(estimate_size(obj, seen) for obj in objs)
+
+    tenants, semantic = {}, False
+    for tenant in tupa.tenant_registry.resident_tenants():
+        semantic = semantic or tenant.semantic_index is not None
+        corpus = size_of(tenant.procedures, tenant.procedure_list)
+        # Una matriz semántica memory-mapped solo cuenta su encabezado (los datos están en el archivo)
+        indices = size_of(tenant.autocomplete_index, tenant.passage_index, tenant.search_bundle,
+                          tenant.semantic_index) + len(tenant.search_bundle_json) + len(tenant.search_bundle_gzip)
+        caches = size_of(tenant.response_cache)
+        tenants[tenant.tenant_id] = {"corpus": corpus, "indices": indices, "caches": caches,
+                                     "respuestas_en_cache": len(tenant.response_cache),
+                                     # Lo que la LRUCache contabiliza contra su límite (incluye lo compartido con el corpus)
+                                     "cache_contabilizada_bytes": tenant.response_cache.size_bytes}
+
+    history = size_of(conversation_log)
+    rate_limiter, rate_limiter_keys = 0, 0
+    if tupa.rate_limiter is not None:
+        rate_limiter = size_of(tupa.rate_limiter)
+        rate_limiter_keys = sum(len(buckets) for buckets, _ in tupa.rate_limiter._stripes)
+    report = {
+        "tenants": tenants,
+        "sesiones": {"bytes": history + rate_limiter,
+                     "historial_bytes": history, "mensajes_en_historial": len(conversation_log),
+                     "limitador_bytes": rate_limiter, "claves_limitador": rate_limiter_keys},
+    }
+    if tupa.query_log_writer is not None:
+        report["registro_consultas"] = {"en_cola": tupa.query_log_writer._queue.qsize(),
+                                        "descartados": tupa.query_log_writer.dropped}
+    if semantic:
+        report["ngramas_en_cache"] = word_hashes.cache_info().currsize
+    return report
+
+
+def create_memory_diagnostics():
+    """
+    Activa el diagnóstico si MEMORY_DIAGNOSTICS=1 (inicia tracemalloc con
+    TRACEMALLOC_FRAMES frames). Retorna None cuando está desactivado.
+    """
+    if os.environ.get("MEMORY_DIAGNOSTICS", "") != "1":
+        return None
+    frames = int(os.environ.get("TRACEMALLOC_FRAMES", "16"))
+    logging.warning(f"Diagnóstico de memoria activado (tracemalloc, {frames} frames): "
+                    f"las peticiones serán más lentas.")
+    return MemoryDiagnostics(frames)
+
+
+def format_bytes(n):
+    return f"{n / 1024:,.1f} KiB" if abs(n) < 1024 * 1024 else f"{n / (1024 * 1024):,.2f} MiB"
+
+
+def print_report(report):
+    snapshot = report["tracemalloc"]
+    print(f"Memoria trazada: {format_bytes(snapshot['actual_bytes'])} (pico {format_bytes(snapshot['pico_bytes'])})")
+    print(f"\n{'atribución por archivo':<26} {'memoria':>14} {'bloques':>10}")
+    for name, stat in snapshot["atribucion_por_archivo"].items():
+        print(f"{name:<26} {format_bytes(stat['bytes']):>14} {stat['bloques']:>10}")
+
+    structures = report["estructuras"]
+    print(f"\n{'tenant (medido)':<16} {'corpus':>14} {'indices':>14} {'caches':>14} {'contabilizado':>14} "
+          f"{'respuestas':>10}")
+    for tenant_id, sizes in structures["tenants"].items():
+        print(f"{tenant_id:<16} {format_bytes(sizes['corpus']):>14} {format_bytes(sizes['indices']):>14} "
+              f"{format_bytes(sizes['caches']):>14} {format_bytes(sizes['cache_contabilizada_bytes']):>14} "
+              f"{sizes['respuestas_en_cache']:>10}")
+    sessions = structures["sesiones"]
+    print(f"sesiones: {format_bytes(sessions['bytes'])} (historial {format_bytes(sessions['historial_bytes'])}, "
+          f"{sessions['mensajes_en_historial']} mensajes; limitador {format_bytes(sessions['limitador_bytes'])}, "
+          f"{sessions['claves_limitador']} claves)")
+    if "registro_consultas" in structures:
+        query_log = structures["registro_consultas"]
+        print(f"registro de consultas: {query_log['en_cola']} en cola, {query_log['descartados']} descartados")
+    if "ngramas_en_cache" in structures:
+        print(f"n-gramas en caché (recuperación semántica): {structures['ngramas_en_cache']}")
+
+    requests = report["peticiones"]
+    print(f"\nPeticiones medidas: {requests['peticiones']}")
+    for title, key, as_bytes in (("pico transitorio", "pico_transitorio", True),
+                                 ("bytes retenidos", "bytes_retenidos", True),
+                                 ("bloques retenidos netos", "bloques_retenidos_netos", False)):
+        histogram = requests[key]
+        average = format_bytes(histogram['promedio']) if as_bytes else histogram['promedio']
+        maximum = format_bytes(histogram['max']) if as_bytes else histogram['max']
+        print(f"  {title} (promedio {average}, máximo {maximum}):")
+        for label, count in histogram["casillas"]:
+            if count:
+                print(f"    {label:<18} {count:>6} {'#' * min(count, 50)}")
+
+    print(f"\n{'rama':<30} {'peticiones':>10} {'pico_prom':>12} {'retenido_prom':>14}")
+    for branch, stat in requests["por_rama"].items():
+        print(f"{branch:<30} {stat['peticiones']:>10} {format_bytes(stat['pico_promedio_bytes']):>12} "
+              f"{format_bytes(stat['retenido_promedio_bytes']):>14}")
+
+    print(f"\n{'sitio':<40} {'archivo':<18} {'memoria':>12} {'bloques':>8}")
+    for site in snapshot["principales_sitios"]:
+        print(f"{site['sitio']:<40} {site['archivo']:<18} {format_bytes(site['bytes']):>12} {site['bloques']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memoria por archivo y por estructura, y asignaciones por petición de /chat.")
+    parser.add_argument("--queries-file", help="Registro JSONL de consultas (QUERY_LOG_PATH) a reproducir")
+    parser.add_argument("--limit", type=int, help="Máximo de consultas del registro")
+    parser.add_argument("--repeat", type=int, default=3, help="Veces que se envía cada consulta")
+    parser.add_argument("--top", type=int, default=15, help="Sitios de asignación a mostrar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    os.environ["MEMORY_DIAGNOSTICS"] = "1"
+    os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+    logging.disable(logging.CRITICAL)
+
+    if args.queries_file:
+        from replay_queries import load_query_log
+        messages = [r["message"] for r in load_query_log(args.queries_file, args.limit) if r.get("message")]
+    else:
+        messages = DEFAULT_DIAGNOSTIC_QUERIES
+
+    from app import create_app
+    app = create_app(warm_up="sync")
+    client = app.test_client()
+    for _ in range(args.repeat):
+        for message in messages:
+            client.post('/chat', json={'message': message})
+
+    report = client.get(f'/diagnostics/memory?top={args.top}').get_json()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Detección de procedimientos TUPA duplicados y casi duplicados.
+
+Dos niveles:
+  - Fusión automática, al cargar el tenant: los registros con el mismo título
+    normalizado (sin tildes, mayúsculas, puntuación ni espacios repetidos) se
+    colapsan en un registro canónico; los demás quedan como alias que apuntan a él.
+  - Revisión editorial, bajo demanda (este script):
+    cada procedimiento se reduce a trigramas de palabras (título, descripción y
+    requisitos) y a una firma MinHash; las firmas se agrupan por bandas (LSH) y los
+    candidatos se confirman con la similitud de Jaccard exacta. Estos grupos solo
+    se reportan: el TUPA usa plantillas y procedimientos distintos ("Modalidad C" /
+    "Modalidad D", riesgo "alto" / "muy alto") comparten casi todo el texto.
+
+Uso (reporte para revisión editorial):
+    python near_duplicates.py [--data-dir DIR] [--threshold 0.8] [--json]
+"""
+import argparse
+import json
+import logging
+import sys
+import zlib
+
+from autocomplete import fold_text, fold_words
+from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+
+SHINGLE_SIZE = 3
+MINHASH_BINS = 64
+LSH_BANDS = 16
+SIMILARITY_THRESHOLD = 0.8
+
+_BIN_BITS = 6  # log2(MINHASH_BINS)
+_VALUE_RANGE = 1 << (32 - _BIN_BITS)
+
+
+def procedure_shingles(proc, size=SHINGLE_SIZE):
+    """Conjunto de hashes (crc32) de los n-gramas de palabras que describen el procedimiento."""
+    text = " ".join([proc.get('titulo', ''), proc.get('descripcion', '')] + list(proc.get('requisitos', [])))
+    words = fold_words(text)
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signature(shingles, bins=MINHASH_BINS):
+    """
+    Firma MinHash de una sola permutación (one permutation hashing): los bits bajos
+    del hash eligen la casilla y se guarda el mínimo de los bits altos. Un solo recorrido
+    por los shingles en lugar de uno por permutación. Las casillas vacías toman el
+    valor de la siguiente casilla ocupada (densificación) para que la firma sirva en LSH.
+    """
+    signature = [None] * bins
+    for x in shingles:
+        b, value = x & (bins - 1), x >> _BIN_BITS
+        if signature[b] is None or value < signature[b]:
+            signature[b] = value
+    if all(v is None for v in signature):
+        return tuple([_VALUE_RANGE] * bins)
+    for b in range(bins):
+        if signature[b] is None:
+            distance = 1
+            while signature[(b + distance) % bins] is None:
+                distance += 1
+            # Desplazamiento por distancia: dos casillas vacías solo coinciden si heredan igual
+            signature[b] = signature[(b + distance) % bins] + distance * _VALUE_RANGE
+    return tuple(signature)
+
+
+def lsh_candidate_pairs(signatures, bands=LSH_BANDS):
+    """Pares (i, j) cuyas firmas coinciden por completo en al menos una banda."""
+    rows = len(signatures[0]) // bands if signatures else 0
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for doc, signature in enumerate(signatures):
+            buckets.setdefault(signature[band * rows:(band + 1) * rows], []).append(doc)
+        for docs in buckets.values():
+            for i in range(len(docs)):
+                for j in range(i + 1, len(docs)):
+                    pairs.add((docs[i], docs[j]))
+    return pairs
+
+
+def completeness(proc):
+    """Criterio para elegir el registro canónico: el más completo gana."""
+    return (
+        sum(1 for field in ('codigo', 'descripcion', 'plazo', 'unidad_presentacion', 'unidad_aprobacion') if proc.get(field)),
+        len(proc.get('requisitos', [])) + len(proc.get('canales_atencion', [])) + len(proc.get('sedes_horarios', [])),
+        len(proc.get('descripcion', '')),
+    )
+
+
+def group_clusters(n, pairs):
+    """Componentes conexas (union-find) de los pares dados; solo grupos de 2 o más."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def find_similar_clusters(procs, threshold=SIMILARITY_THRESHOLD):
+    """
+    Grupos de procedimientos con contenido casi idéntico (Jaccard >= threshold).
+    Retorna [{"canonico": proc, "alias": [(proc, similitud), ...]}] ordenado por tamaño.
+    """
+    shingles = [procedure_shingles(p) for p in procs]
+    signatures = [minhash_signature(s) for s in shingles]
+    pairs = [(i, j) for i, j in lsh_candidate_pairs(signatures) if jaccard(shingles[i], shingles[j]) >= threshold]
+
+    clusters = []
+    for members in group_clusters(len(procs), pairs):
+        canonical = max(members, key=lambda i: (completeness(procs[i]), -i))
+        clusters.append({
+            "canonico": procs[canonical],
+            "alias": [(procs[i], jaccard(shingles[canonical], shingles[i])) for i in members if i != canonical],
+        })
+    clusters.sort(key=lambda c: -len(c["alias"]))
+    return clusters
+
+
+def title_key(proc):
+    """
+    Título normalizado (sin tildes, mayúsculas, puntuación ni espacios repetidos);
+    dos títulos con la misma clave son el mismo procedimiento. Se conserva el orden
+    y la repetición de las palabras: "A DE B" y "B DE A" son trámites distintos.
+    """
+    return fold_text(proc.get('titulo', ''))
+
+
+def canonicalize_procedures(procedures):
+    """
+    Colapsa los duplicados del diccionario que retorna `load_tupa_data`.
+
+    Retorna (procedimientos, lista_canonica, fusionados):
+      - procedimientos: mismas claves; las de los alias apuntan al registro canónico.
+      - lista_canonica: un registro por procedimiento, en el orden de carga y con
+        títulos distintos, lista para puntuar y sugerir sin deduplicar por petición.
+      - fusionados: [{"canonico": proc, "alias": [(proc, similitud), ...]}].
+    """
+    procs, seen_ids = [], set()
+    for proc in procedures.values():
+        if id(proc) not in seen_ids:
+            seen_ids.add(id(proc))
+            procs.append(proc)
+
+    first_by_title, pairs = {}, []
+    for i, proc in enumerate(procs):
+        key = title_key(proc)
+        if key:
+            pairs.append((first_by_title.setdefault(key, i), i))
+
+    canonical_of, merged = {}, []
+    for members in group_clusters(len(procs), pairs):
+        canonical = procs[max(members, key=lambda i: (completeness(procs[i]), -i))]
+        canonical_shingles = procedure_shingles(canonical)
+        # El canónico ocupa la posición del primer miembro del grupo en el orden de carga
+        canonical_of[id(procs[members[0]])] = canonical
+        aliases = []
+        for i in members:
+            if procs[i] is not canonical:
+                canonical_of[id(procs[i])] = canonical
+                aliases.append((procs[i], jaccard(canonical_shingles, procedure_shingles(procs[i]))))
+        merged.append({"canonico": canonical, "alias": aliases})
+        logging.info(f"Procedimiento duplicado: \"{canonical.get('titulo')}\" ({canonical.get('codigo')}) "
+                     f"absorbe {[alias.get('codigo') or alias.get('titulo') for alias, _ in aliases]}")
+
+    canonical_list, placed = [], set()
+    for proc in procs:
+        target = canonical_of.get(id(proc), proc)
+        if id(target) not in placed:
+            placed.add(id(target))
+            canonical_list.append(target)
+
+    canonical_procedures = {key: canonical_of.get(id(proc), proc) for key, proc in procedures.items()}
+    return canonical_procedures, canonical_list, merged
+
+
+def format_cluster_report(clusters):
+    lines = []
+    for n, entry in enumerate(clusters, 1):
+        canonical = entry['canonico']
+        lines.append(f"[{n}] {canonical.get('titulo', '').strip()} ({canonical.get('codigo') or 'sin código'})")
+        for alias, similarity in entry['alias']:
+            lines.append(f"      {similarity:.2f}  {alias.get('titulo', '').strip()} ({alias.get('codigo') or 'sin código'})")
+    return "\n".join(lines)
+
+
+def clusters_to_json(clusters):
+    return [{
+        "canonico": {"titulo": c['canonico'].get('titulo'), "codigo": c['canonico'].get('codigo')},
+        "alias": [{"titulo": a.get('titulo'), "codigo": a.get('codigo'), "similitud": round(s, 3)}
+                  for a, s in c['alias']],
+    } for c in clusters]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reporta los procedimientos TUPA duplicados y casi duplicados.")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Directorio con los archivos TUPA")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Similitud de Jaccard mínima para reportar un grupo (0-1)")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    procedures = load_tupa_data(args.data_dir)
+    _, canonical_list, merged = canonicalize_procedures(procedures)
+    similar = find_similar_clusters(canonical_list, args.threshold)
+
+    if args.json:
+        print(json.dumps({"fusionados": clusters_to_json(merged), "similares": clusters_to_json(similar)},
+                         ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Fusionados automáticamente (mismo título normalizado): {len(merged)} grupos")
+    if merged:
+        print(format_cluster_report(merged))
+    print(f"\nPara revisión editorial (contenido con Jaccard >= {args.threshold}): {len(similar)} grupos")
+    if similar:
+        print(format_cluster_report(similar))
+    total = len({id(p) for p in procedures.values()})
+    print(f"\n{len(canonical_list)} procedimientos canónicos de {total} cargados.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
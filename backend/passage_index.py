@@ -0,0 +1,208 @@
+import math
+import re
+from array import array
+from bisect import bisect_left
+
+from autocomplete import fold_words
+from search_bundle import BUNDLE_STOP_WORDS
+
+# --- ÍNDICE DE PASAJES (REQUISITOS, CANALES, SEDES, MODALIDAD DE PAGO) ---
+# Un pasaje por requisito o línea de sección, con referencia a su procedimiento y
+# sección. Los textos repetidos entre procedimientos ("Copia de DNI", la misma sede)
+# se guardan una sola vez en una tabla de cadenas, que reutiliza los objetos str
+# del corpus (más el offset donde termina la numeración); los pasajes son tres arreglos
+# paralelos de enteros y las listas de aparición (apuntando a la tabla de cadenas)
+# van todas en un mismo arreglo con offsets, sin un objeto por token.
+
+PASSAGE_SECTIONS = ("requisitos", "canales_atencion", "sedes_horarios", "modalidad_pago")
+
+# Numeración al inicio de los requisitos ("1.-", "2.-", "- ") que impide compartir el texto
+_ITEM_NUMBER_RE = re.compile(r'^\s*(?:\d+\s*\.?\s*-\s*|-+\s*)?')
+
+# Separadores entre documentos en "¿qué trámites piden copia de DNI y SOAT?"
+_DOCUMENT_SPLIT_RE = re.compile(r'\s*(?:,|;|\by\b|\be\b|\bademas de\b|\bmas\b)\s*')
+
+# Siglas con puntos ("D.N.I.", "R.U.C"): sin unirlas quedan letras sueltas que se descartan
+_DOTTED_ACRONYM_RE = re.compile(r'\b(?:[^\W\d_]\.)+[^\W\d_]\b\.?')
+
+# Prefijos más cortos que esto no se expanden (evita que "de" o "co" abarquen medio índice)
+MIN_PREFIX_EXPANSION = 4
+
+
+def collapse_acronyms(text):
+    """'Copia de D.N.I. vigente' -> 'Copia de DNI vigente'"""
+    return _DOTTED_ACRONYM_RE.sub(lambda m: m.group(0).replace('.', ''), text)
+
+
+def passage_tokens(text):
+    return [t for t in fold_words(collapse_acronyms(text)) if len(t) > 2 and t not in BUNDLE_STOP_WORDS]
+
+
+def section_lines(proc, section):
+    if section == "modalidad_pago":
+        return proc.get('pago_derecho_tramitacion', {}).get('modalidad', [])
+    return proc.get(section, [])
+
+
+def csr_arrays(groups):
+    """Lista de listas de enteros -> (offsets, valores) en dos arreglos planos."""
+    offsets, values = array('I', [0]), array('I')
+    for group in groups:
+        values.extend(group)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def split_documents(text):
+    """'copia de dni y soat' -> ['copia de dni', 'soat']"""
+    return [part.strip() for part in _DOCUMENT_SPLIT_RE.split(text) if part and part.strip()]
+
+
+class PassageIndex:
+    """
+    Índice invertido de pasajes sobre la lista canónica de procedimientos.
+
+      text(text_id)                       texto del pasaje (sin numeración), único
+      passage_text/proc/section[pid]      referencias de cada pasaje
+      passages_for_text(text_id)          pasajes que comparten ese texto (CSR)
+      tokens[tok_id], texts_for_token()   tokens ordenados -> text_ids (CSR)
+    """
+
+    def __init__(self, procedures):
+        self.procedures = list(procedures)
+        self.strings = []
+        self.string_starts = array('H')
+        self.passage_text = array('I')
+        self.passage_proc = array('I')
+        self.passage_section = array('B')
+
+        string_ids = {}
+        for proc_id, proc in enumerate(self.procedures):
+            for section_id, section in enumerate(PASSAGE_SECTIONS):
+                for line in section_lines(proc, section):
+                    start = _ITEM_NUMBER_RE.match(line).end()
+                    key = line[start:].strip()
+                    if not key:
+                        continue
+                    text_id = string_ids.get(key)
+                    if text_id is None:
+                        text_id = string_ids[key] = len(self.strings)
+                        self.strings.append(line)
+                        self.string_starts.append(start)
+                    self.passage_text.append(text_id)
+                    self.passage_proc.append(proc_id)
+                    self.passage_section.append(section_id)
+
+        # Retro-referencias texto -> pasajes
+        text_passages = [[] for _ in self.strings]
+        for pid, text_id in enumerate(self.passage_text):
+            text_passages[text_id].append(pid)
+        self.text_offsets, self.text_passages = csr_arrays(text_passages)
+
+        postings = {}
+        for text_id, text in enumerate(self.strings):
+            for token in set(passage_tokens(text[self.string_starts[text_id]:])):
+                postings.setdefault(token, []).append(text_id)
+        self.tokens = sorted(postings)
+        self.token_offsets, self.token_texts = csr_arrays(postings[t] for t in self.tokens)
+
+    def __len__(self):
+        return len(self.passage_text)
+
+    def text(self, text_id):
+        return self.strings[text_id][self.string_starts[text_id]:].strip()
+
+    def passages_for_text(self, text_id):
+        return self.text_passages[self.text_offsets[text_id]:self.text_offsets[text_id + 1]]
+
+    def texts_for_token(self, token_id):
+        return self.token_texts[self.token_offsets[token_id]:self.token_offsets[token_id + 1]]
+
+    def _token_ids(self, token):
+        """Ids del token exacto y, si es suficientemente largo, de los que empiezan con él (plurales, derivados)."""
+        start = bisect_left(self.tokens, token)
+        if len(token) < MIN_PREFIX_EXPANSION:
+            return [start] if start < len(self.tokens) and self.tokens[start] == token else []
+        end = start
+        while end < len(self.tokens) and self.tokens[end].startswith(token):
+            end += 1
+        return range(start, end)
+
+    def _texts_with(self, token):
+        texts = set()
+        for token_id in self._token_ids(token):
+            texts.update(self.texts_for_token(token_id))
+        return texts
+
+    def _texts_with_all(self, tokens):
+        texts = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            matched = self._texts_with(token)
+            texts = matched if texts is None else texts & matched
+            if not texts:
+                return set()
+        return texts or set()
+
+    def search(self, query, section=None, limit=10, max_procedures=10):
+        """
+        Textos de pasaje que mejor cubren la consulta; cada token suma su idf.
+        Los pasajes con el mismo texto y sección se agrupan en un resultado:
+        {texto, seccion, score, total, procedimientos: [{titulo, codigo}, ...]}.
+        """
+        tokens = set(passage_tokens(query))
+        if not tokens:
+            return []
+        section_id = PASSAGE_SECTIONS.index(section) if section in PASSAGE_SECTIONS else None
+
+        scores = {}
+        for token in tokens:
+            texts = self._texts_with(token)
+            if not texts:
+                continue
+            idf = math.log(1 + len(self.strings) / len(texts))
+            for text_id in texts:
+                scores[text_id] = scores.get(text_id, 0.0) + idf
+
+        results = []
+        for text_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+            by_section = {}
+            for pid in self.passages_for_text(text_id):
+                if section_id is None or self.passage_section[pid] == section_id:
+                    by_section.setdefault(self.passage_section[pid], []).append(self.passage_proc[pid])
+            for passage_section, proc_ids in sorted(by_section.items()):
+                results.append({
+                    "texto": self.text(text_id),
+                    "seccion": PASSAGE_SECTIONS[passage_section],
+                    "score": round(score, 3),
+                    "total": len(proc_ids),
+                    "procedimientos": [{"titulo": self.procedures[i].get('titulo', ''),
+                                        "codigo": self.procedures[i].get('codigo', '')}
+                                       for i in proc_ids[:max_procedures]],
+                })
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def procedures_requiring(self, documents, section="requisitos"):
+        """
+        Procedimientos que, en la sección dada, mencionan todos los documentos
+        (cada documento es una frase; basta con un pasaje que contenga todas sus
+        palabras). Retorna los procedimientos en el orden de la lista canónica.
+        """
+        section_id = PASSAGE_SECTIONS.index(section)
+        matching = None
+        for document in documents:
+            tokens = passage_tokens(document)
+            if not tokens:
+                continue
+            procs = set()
+            for text_id in self._texts_with_all(tokens):
+                for pid in self.passages_for_text(text_id):
+                    if self.passage_section[pid] == section_id:
+                        procs.add(self.passage_proc[pid])
+            matching = procs if matching is None else matching & procs
+            if not matching:
+                return []
+        if matching is None:
+            return []
+        return [self.procedures[proc_id] for proc_id in sorted(matching)]
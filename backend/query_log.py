@@ -0,0 +1,101 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+
+# --- CAPTURA DE CONSULTAS /chat (OPCIONAL Y ANONIMIZADA) ---
+# La captura se activa solo si se define QUERY_LOG_PATH. Cada registro es una
+# línea JSON que se añade al final del archivo desde un hilo en segundo plano,
+# de modo que la ruta /chat solo encola un diccionario y nunca toca el disco.
+
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+# DNI (8 dígitos), RUC (11), teléfonos y cualquier otra secuencia numérica larga
+LONG_NUMBER_PATTERN = re.compile(r'\d{6,}')
+
+
+def anonymize_message(text):
+    """
+    Elimina datos personales evidentes del mensaje (correos y números largos
+    como DNI, RUC o teléfonos) manteniendo la forma de la consulta.
+    """
+    text = EMAIL_PATTERN.sub('<correo>', text)
+    return LONG_NUMBER_PATTERN.sub('<numero>', text)
+
+
+def hash_session(session_id, salt):
+    """Seudonimiza el identificador de sesión con un hash salado y truncado."""
+    if not session_id:
+        return ""
+    return hashlib.sha256(f"{salt}:{session_id}".encode('utf-8')).hexdigest()[:16]
+
+
+class QueryLogWriter:
+    """
+    Escritor de registros en segundo plano. `submit` no bloquea: si la cola
+    está llena el registro se descarta y se contabiliza en `dropped`.
+    """
+
+    def __init__(self, path, max_queue_size=10000):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5):
+        """Vacía la cola pendiente y detiene el hilo escritor. Llamarlo de nuevo no hace nada."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                record = self._queue.get()
+                batch = [record]
+                # Agrupa lo que ya esté encolado para escribirlo en una sola llamada
+                while record is not None:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(record)
+
+                lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in batch if r is not None]
+                if lines:
+                    try:
+                        f.writelines(lines)
+                        f.flush()
+                    except OSError as e:
+                        logging.error(f"Error al escribir el registro de consultas en {self.path}: {e}")
+
+                if batch[-1] is None:
+                    return
+
+
+def create_query_log_writer():
+    """
+    Crea el escritor si QUERY_LOG_PATH está definido en el entorno.
+    Retorna None cuando la captura está desactivada (comportamiento por defecto).
+    """
+    path = os.environ.get("QUERY_LOG_PATH")
+    if not path:
+        return None
+    logging.info(f"Captura de consultas /chat activada en: {os.path.abspath(path)}")
+    writer = QueryLogWriter(path)
+    # El hilo escritor es daemon: sin esto los registros aún en cola se perderían al apagar el servidor
+    atexit.register(writer.close)
+    return writer
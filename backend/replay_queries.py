@@ -0,0 +1,210 @@
+"""
+Reproduce un registro de consultas capturado (QUERY_LOG_PATH) contra un servidor
+local, respetando la forma temporal del tráfico original escalada por --speed.
+
+Todas las consultas salen de la misma IP: el servidor de destino debe ejecutarse con
+el limitador desactivado o responderá 429 a partir de la ráfaga permitida:
+
+    RATE_LIMIT_PER_SECOND=0 python app.py
+
+Uso:
+    python replay_queries.py consultas.jsonl --speed 10 --concurrency 8
+    python replay_queries.py consultas.jsonl --speed max --url http://127.0.0.1:5000
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_query_log(path, limit=None):
+    """Lee el registro JSONL y lo ordena por marca de tiempo."""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    records.sort(key=lambda r: r.get("ts", 0))
+    if limit:
+        records = records[:limit]
+    return records
+
+
+def chat_url(base_url, record):
+    """/t/<tenant>/chat para los registros de un tenant concreto; /chat (tenant por defecto) si no lo indican."""
+    tenant = record.get("tenant")
+    if tenant:
+        return f"{base_url}/t/{urllib.parse.quote(tenant, safe='')}/chat"
+    return f"{base_url}/chat"
+
+
+def send_chat_request(base_url, record, timeout):
+    """Envía una consulta a /chat y retorna (status, latencia_ms, rama, sha de la respuesta)."""
+    body = json.dumps({"message": record.get("message", "")}).encode('utf-8')
+    headers = {"Content-Type": "application/json"}
+    if record.get("session"):
+        headers["X-Session-Id"] = record["session"]
+    req = urllib.request.Request(chat_url(base_url, record), data=body, headers=headers, method='POST')
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            data = resp.read()
+            status = resp.status
+            branch = resp.headers.get('X-Chat-Branch', '')
+    except urllib.error.HTTPError as e:
+        data = e.read()
+        status = e.code
+        branch = e.headers.get('X-Chat-Branch', '')
+    except (urllib.error.URLError, OSError):
+        return 0, (time.perf_counter() - start) * 1000, '', ''
+    latency_ms = (time.perf_counter() - start) * 1000
+    return status, latency_ms, branch, hashlib.sha1(data).hexdigest()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def replay(records, base_url, speed, concurrency, timeout=30):
+    """
+    Emite las consultas respetando los intervalos originales divididos por `speed`
+    (None = tan rápido como permita la concurrencia) y retorna la lista de resultados.
+    """
+    results = []
+    results_lock = threading.Lock()
+
+    def worker(record):
+        status, latency_ms, branch, response_sha = send_chat_request(base_url, record, timeout)
+        with results_lock:
+            results.append({
+                "record": record,
+                "status": status,
+                "latency_ms": latency_ms,
+                "branch": branch,
+                "response_sha": response_sha,
+            })
+
+    if not records:
+        return results, 0.0
+
+    first_ts = records[0].get("ts", 0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            if speed:
+                target = (record.get("ts", first_ts) - first_ts) / speed
+                delay = target - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(worker, record)
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(results, elapsed):
+    """Calcula rendimiento, distribución de latencias y diferencias respecto a la captura."""
+    latencies = sorted(r["latency_ms"] for r in results)
+    original_latencies = sorted(r["record"]["latency_ms"] for r in results if "latency_ms" in r["record"])
+    status_counts = Counter(r["status"] for r in results)
+
+    branch_changes = Counter()
+    response_diffs = 0
+    for r in results:
+        original_branch = r["record"].get("branch", "")
+        if original_branch and r["branch"] != original_branch:
+            branch_changes[f"{original_branch} -> {r['branch'] or '?'}"] += 1
+        original_sha = r["record"].get("response_sha", "")
+        if original_sha and r["response_sha"] and r["response_sha"] != original_sha:
+            response_diffs += 1
+
+    def latency_summary(values):
+        return {
+            "p50": round(percentile(values, 50), 3),
+            "p90": round(percentile(values, 90), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(values[-1], 3) if values else 0.0,
+        }
+
+    return {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "status": {str(k): v for k, v in sorted(status_counts.items())},
+        "latency_ms": latency_summary(latencies),
+        "original_latency_ms": latency_summary(original_latencies),
+        "branch_changes": dict(branch_changes.most_common()),
+        "response_diffs": response_diffs,
+    }
+
+
+def print_report(summary):
+    print(f"Consultas reproducidas: {summary['requests']} en {summary['elapsed_s']} s "
+          f"({summary['throughput_rps']} req/s)")
+    print(f"Códigos de estado: {summary['status']}")
+    if summary['status'].get('429'):
+        print("  (429: el servidor limitó la tasa; ejecútalo con RATE_LIMIT_PER_SECOND=0 para reproducir)")
+    lat, orig = summary["latency_ms"], summary["original_latency_ms"]
+    print(f"Latencia (ms)  p50={lat['p50']}  p90={lat['p90']}  p99={lat['p99']}  max={lat['max']}")
+    print(f"Original (ms)  p50={orig['p50']}  p90={orig['p90']}  p99={orig['p99']}  max={orig['max']}")
+    print(f"Respuestas distintas a la captura: {summary['response_diffs']}")
+    if summary["branch_changes"]:
+        print("Cambios de rama:")
+        for change, count in summary["branch_changes"].items():
+            print(f"  {change}: {count}")
+
+
+def parse_speed(value):
+    if value == 'max':
+        return None
+    speed = float(value.rstrip('x'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("La velocidad debe ser mayor que 0 o 'max'.")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reproduce un registro de consultas /chat contra un servidor local.",
+        epilog="Ejecuta el servidor de destino con RATE_LIMIT_PER_SECOND=0: todas las consultas "
+               "salen de la misma IP y el limitador las rechazaría con 429.")
+    parser.add_argument("log", help="Archivo JSONL generado con QUERY_LOG_PATH")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="URL base del servidor")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="Factor de aceleración (1, 10, ...) o 'max'")
+    parser.add_argument("--concurrency", type=int, default=4, help="Número máximo de peticiones simultáneas")
+    parser.add_argument("--limit", type=int, default=None, help="Reproducir solo las primeras N consultas")
+    parser.add_argument("--timeout", type=float, default=30, help="Tiempo máximo por petición en segundos")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen en formato JSON")
+    args = parser.parse_args(argv)
+
+    records = load_query_log(args.log, args.limit)
+    if not records:
+        print(f"No hay consultas en {args.log}.", file=sys.stderr)
+        return 1
+
+    results, elapsed = replay(records, args.url.rstrip('/'), args.speed, args.concurrency, args.timeout)
+    summary = summarize(results, elapsed)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_report(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
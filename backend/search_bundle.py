@@ -0,0 +1,114 @@
+"""
+Índice de búsqueda compacto para el navegador: títulos, códigos, tokens
+normalizados y listas de aparición (postings), versionado con un hash del corpus.
+frontend/script.js consulta /corpus_version y descarga /search_index.json?v=<versión>,
+que se sirve como inmutable: queda en la caché HTTP del navegador mientras la versión
+no cambie, y con él calcula las sugerencias sin pasar por el servidor.
+
+Uso:
+    python search_bundle.py --out ../frontend/dist/search_index.json
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+
+from autocomplete import AUTOCOMPLETE_SYNONYMS, fold_text
+from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+
+SEARCH_BUNDLE_FORMAT = 1
+
+# Palabras vacías en forma normalizada (sin tildes); no aportan a las sugerencias
+BUNDLE_STOP_WORDS = {
+    "de", "del", "la", "las", "el", "los", "y", "o", "u", "en", "para", "por", "con", "sin",
+    "que", "se", "su", "sus", "al", "a", "un", "una", "lo", "es", "como", "otros", "otro",
+}
+
+
+def tokenize(text):
+    return [t for t in fold_text(text).split() if len(t) > 2 and t not in BUNDLE_STOP_WORDS]
+
+
+def unique_procedures(procedures):
+    unique, seen_ids = [], set()
+    for proc in procedures.values():
+        if id(proc) not in seen_ids and proc.get('titulo'):
+            seen_ids.add(id(proc))
+            unique.append(proc)
+    return unique
+
+
+def bundle_version(bundle):
+    """
+    Hash del contenido del índice (formato, títulos, códigos, tokens, postings y
+    sinónimos). El navegador lo guarda un año bajo ?v=<versión>, así que cambia con
+    cualquier cosa que altere lo que descarga: el corpus, las palabras vacías, la
+    tokenización, AUTOCOMPLETE_SYNONYMS o SEARCH_BUNDLE_FORMAT.
+    """
+    data = json.dumps(bundle, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def build_search_bundle(procedures):
+    """
+    Construye el índice serializable. Cada posting es `doc * 2 + en_titulo`, de modo
+    que una sola lista de enteros indica el documento y el campo donde aparece.
+    """
+    procs = sorted(unique_procedures(procedures), key=lambda p: fold_text(p['titulo']))
+
+    postings = {}
+    for doc, proc in enumerate(procs):
+        title_tokens = set(tokenize(proc['titulo']))
+        description_tokens = set(tokenize(proc.get('descripcion', ''))) - title_tokens
+        for token in title_tokens:
+            postings.setdefault(token, []).append(doc * 2 + 1)
+        for token in description_tokens:
+            postings.setdefault(token, []).append(doc * 2)
+
+    folded_titles = [fold_text(p['titulo']) for p in procs]
+    synonyms = {}
+    for synonym, target in AUTOCOMPLETE_SYNONYMS.items():
+        target = fold_text(target)
+        docs = [doc for doc, title in enumerate(folded_titles) if target in title]
+        if docs:
+            synonyms[fold_text(synonym)] = docs
+
+    tokens = sorted(postings)
+    bundle = {
+        "format": SEARCH_BUNDLE_FORMAT,
+        "titles": [p['titulo'] for p in procs],
+        "codes": [p.get('codigo', '') for p in procs],
+        "tokens": tokens,
+        "postings": [postings[t] for t in tokens],
+        "synonyms": synonyms,
+    }
+    bundle["version"] = bundle_version(bundle)
+    return bundle
+
+
+def serialize_search_bundle(bundle):
+    """Retorna (json_bytes, gzip_bytes) en forma compacta."""
+    data = json.dumps(bundle, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return data, gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta el índice de búsqueda del navegador.")
+    parser.add_argument("--out", default="search_index.json", help="Archivo de salida (.gz se escribe al lado)")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Directorio con los archivos TUPA")
+    args = parser.parse_args(argv)
+
+    bundle = build_search_bundle(load_tupa_data(args.data_dir))
+    data, compressed = serialize_search_bundle(bundle)
+    with open(args.out, 'wb') as f:
+        f.write(data)
+    with open(args.out + '.gz', 'wb') as f:
+        f.write(compressed)
+    print(f"Índice versión {bundle['version']}: {len(bundle['titles'])} procedimientos, "
+          f"{len(bundle['tokens'])} tokens, {len(data)} bytes ({len(compressed)} bytes gzip)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Recuperación semántica local (sin red ni GPU) con vectores de n-gramas de caracteres.
+
+Cada procedimiento se representa con las palabras y los n-gramas de 3 a 5 caracteres
+de su título (con doble peso), su descripción y los sinónimos curados que apuntan a él,
+proyectados con hashing firmado a `dim` dimensiones, ponderados por idf y normalizados.
+La matriz (float32, una fila por procedimiento canónico) se construye al cargar el
+tenant o se abre con np.load(mmap_mode='r') desde un archivo precalculado:
+
+    python semantic_index.py [--data-dir DIR] [--dim 1024]
+
+escribe semantic_index.npy y semantic_index.json en el directorio de datos. Si el
+corpus cambió (la versión no coincide), el archivo se ignora y la matriz se recalcula.
+
+La búsqueda es exacta (producto matriz-vector) o aproximada con un índice por
+particiones (k-means esférico, IVF) cuyos candidatos se reordenan con el coseno exacto.
+Se activa con SEMANTIC_RETRIEVAL=1 y requiere NumPy (requirements-semantic.txt).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import zlib
+from functools import lru_cache
+
+from autocomplete import AUTOCOMPLETE_SYNONYMS, fold_text, fold_words
+from search_bundle import BUNDLE_STOP_WORDS
+
+SEMANTIC_INDEX_FORMAT = 1
+SEMANTIC_DIM = 1024
+SEMANTIC_MATRIX_FILE = "semantic_index.npy"
+SEMANTIC_META_FILE = "semantic_index.json"
+
+NGRAM_SIZES = (3, 4, 5)
+TITLE_WEIGHT = 2.0
+
+# Palabras de relleno típicas de las consultas ("quiero", "necesito") que no describen el trámite
+SEMANTIC_STOP_WORDS = BUNDLE_STOP_WORDS | {
+    "quiero", "necesito", "voy", "me", "mi", "mis", "hacer", "como", "donde", "puedo", "tengo",
+    "saber", "hay", "tramite", "tramites", "procedimiento", "ayuda", "favor", "informacion",
+}
+
+# Con 10 200 filas (50 veces el TUPA de Puno) la búsqueda exacta toma ~3 ms; el índice
+# aproximado solo conviene bastante más arriba (ver benchmarks/bench_semantic.py)
+ANN_MIN_ROWS = 20000
+KMEANS_ITERATIONS = 10
+IVF_PROBES = 8
+
+
+# NumPy es opcional y se importa al crear el primer índice: importar app.py no lo carga
+np = None
+
+
+def numpy_available():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+def semantic_words(text):
+    return [w for w in fold_words(text) if len(w) > 1 and w not in SEMANTIC_STOP_WORDS]
+
+
+@lru_cache(maxsize=65536)
+def word_hashes(word):
+    """Hashes (crc32) de la palabra y de los n-gramas de caracteres de '<palabra>'."""
+    padded = f"<{word}>".encode('ascii')
+    return (zlib.crc32(b"w:" + word.encode('ascii')),) + tuple(
+        zlib.crc32(padded[i:i + n]) for n in NGRAM_SIZES for i in range(len(padded) - n + 1))
+
+
+def hashed_features(text, weight=1.0):
+    """Pares (palabra, peso) de las palabras significativas del texto."""
+    return [(word, weight) for word in semantic_words(text)]
+
+
+def procedure_features(proc, synonyms_by_title):
+    title = proc.get('titulo', '')
+    features = hashed_features(title, TITLE_WEIGHT)
+    features += hashed_features(proc.get('descripcion', ''))
+    for synonym in synonyms_by_title.get(id(proc), ()):
+        features += hashed_features(synonym, TITLE_WEIGHT)
+    return features
+
+
+def synonyms_for_procedures(procedures):
+    """Sinónimos curados cuyo destino aparece en el título: 'boda' -> MATRIMONIO CIVIL."""
+    folded_targets = [(synonym, fold_text(target)) for synonym, target in AUTOCOMPLETE_SYNONYMS.items()]
+    synonyms = {}
+    for proc in procedures:
+        title = fold_text(proc.get('titulo', ''))
+        matches = [synonym for synonym, target in folded_targets if target in title]
+        if matches:
+            synonyms[id(proc)] = matches
+    return synonyms
+
+
+def index_version(procedures, dim):
+    """Cambia si cambia el formato, la dimensión, el orden o el texto indexado de los procedimientos."""
+    digest = hashlib.sha1(f"{SEMANTIC_INDEX_FORMAT}:{dim}".encode('ascii'))
+    for proc in procedures:
+        for field in ('titulo', 'codigo', 'descripcion'):
+            digest.update(proc.get(field, '').encode('utf-8'))
+            digest.update(b'\x00')
+    digest.update(json.dumps(AUTOCOMPLETE_SYNONYMS, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def word_projection(words, dim):
+    """
+    Vector de cada palabra: hashing firmado de sus n-gramas (el bit 31 del hash decide
+    el signo, los bits bajos la columna). Se calcula una vez por palabra distinta.
+    """
+    word_ids, hashes = [], []
+    for word_id, word in enumerate(words):
+        word_hash = word_hashes(word)
+        word_ids.extend([word_id] * len(word_hash))
+        hashes.extend(word_hash)
+    hashes = np.array(hashes, dtype=np.int64)
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    flat = np.bincount(np.array(word_ids, dtype=np.int64) * dim + (hashes & (dim - 1)), weights=signs,
+                       minlength=len(words) * dim)
+    return flat.reshape(len(words), dim).astype(np.float32)
+
+
+def features_to_matrix(feature_lists, dim, chunk_rows=1024):
+    """Filas = (conteos ponderados de palabras) x (vectores de palabras), por bloques de filas."""
+    vocabulary, row_ids, word_ids, weights = {}, [], [], []
+    for row, features in enumerate(feature_lists):
+        for word, weight in features:
+            row_ids.append(row)
+            word_ids.append(vocabulary.setdefault(word, len(vocabulary)))
+            weights.append(weight)
+    matrix = np.zeros((len(feature_lists), dim), dtype=np.float32)
+    if not vocabulary:
+        return matrix
+    projection = word_projection(list(vocabulary), dim)
+    row_ids, word_ids, weights = np.array(row_ids), np.array(word_ids), np.array(weights)
+    for start in range(0, len(feature_lists), chunk_rows):
+        end = min(start + chunk_rows, len(feature_lists))
+        lo, hi = np.searchsorted(row_ids, [start, end])
+        counts = np.bincount((row_ids[lo:hi] - start) * len(vocabulary) + word_ids[lo:hi], weights=weights[lo:hi],
+                             minlength=(end - start) * len(vocabulary))
+        matrix[start:end] = counts.reshape(end - start, len(vocabulary)).astype(np.float32) @ projection
+    return matrix
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class ClusterIndex:
+    """
+    Índice aproximado por particiones (IVF): k-means esférico sobre las filas y, por
+    consulta, solo se revisan las filas de las `probes` particiones con centroide más
+    cercano. Los ids se guardan ordenados por partición (una partición = un tramo).
+    """
+
+    def __init__(self, matrix, clusters=None, iterations=KMEANS_ITERATIONS, seed=0):
+        matrix = np.asarray(matrix)
+        clusters = min(clusters or max(1, round(math.sqrt(len(matrix)))), len(matrix))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(matrix), clusters, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            one_hot = np.zeros((clusters, len(matrix)), dtype=np.float32)
+            one_hot[assignment, np.arange(len(matrix))] = 1.0
+            sums = one_hot @ matrix
+            # Una partición que quedó vacía conserva su centroide anterior
+            empty = ~one_hot.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums).astype(np.float32)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.order = np.argsort(assignment, kind='stable')
+        self.starts = np.searchsorted(assignment[self.order], np.arange(clusters + 1))
+
+    def candidates(self, vector, probes=IVF_PROBES):
+        """Ids (ordenados) de las filas de las particiones más cercanas al vector."""
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+        return np.sort(np.concatenate([self.order[self.starts[c]:self.starts[c + 1]] for c in nearest]))
+
+
+class SemanticIndex:
+    """Matriz de vectores de procedimientos (una fila por procedimiento canónico) y su idf."""
+
+    def __init__(self, procedures, matrix, idf, version, mmapped=False):
+        self.procedures = list(procedures)
+        self.matrix = matrix
+        self.idf = idf
+        self.version = version
+        self.mmapped = mmapped
+        self.dim = matrix.shape[1]
+        self.ann = ClusterIndex(matrix) if len(self.procedures) >= ANN_MIN_ROWS else None
+
+    @classmethod
+    def build(cls, procedures, dim=SEMANTIC_DIM):
+        procedures = list(procedures)
+        synonyms = synonyms_for_procedures(procedures)
+        counts = features_to_matrix([procedure_features(p, synonyms) for p in procedures], dim)
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = (np.log((1 + len(procedures)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = normalize_rows(counts * idf).astype(np.float32)
+        return cls(procedures, matrix, idf, index_version(procedures, dim))
+
+    @classmethod
+    def load_or_build(cls, procedures, data_dir, dim=SEMANTIC_DIM):
+        """Abre la matriz precalculada del directorio de datos (memory-mapped) si corresponde al corpus."""
+        procedures = list(procedures)
+        matrix_path = os.path.join(data_dir, SEMANTIC_MATRIX_FILE)
+        meta_path = os.path.join(data_dir, SEMANTIC_META_FILE)
+        if os.path.isfile(matrix_path) and os.path.isfile(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                expected = index_version(procedures, meta.get("dim", dim))
+                if meta.get("version") == expected:
+                    matrix = np.load(matrix_path, mmap_mode='r')
+                    if matrix.shape == (len(procedures), meta["dim"]):
+                        idf = np.array(meta["idf"], dtype=np.float32)
+                        return cls(procedures, matrix, idf, expected, mmapped=True)
+                logging.warning(f"Índice semántico precalculado desactualizado en {data_dir}; se recalcula.")
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"No se pudo abrir el índice semántico precalculado: {e}")
+        return cls.build(procedures, dim)
+
+    def save(self, data_dir):
+        np.save(os.path.join(data_dir, SEMANTIC_MATRIX_FILE), np.asarray(self.matrix))
+        with open(os.path.join(data_dir, SEMANTIC_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"format": SEMANTIC_INDEX_FORMAT, "version": self.version, "dim": self.dim,
+                       "rows": len(self.procedures), "idf": [round(float(x), 6) for x in self.idf]}, f)
+
+    def embed(self, text):
+        vector = features_to_matrix([hashed_features(text)], self.dim)[0] * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, query, k=10, method="auto"):
+        """
+        Los `k` procedimientos más similares a la consulta: [(proc, similitud coseno)].
+        method: "exact" (toda la matriz), "ann" (particiones más cercanas, reordenadas
+        con el coseno exacto) o "auto" (ann solo a partir de ANN_MIN_ROWS filas).
+        """
+        return [(self.procedures[i], score) for i, score in self.search_ids(self.embed(query), k, method)]
+
+    def search_ids(self, vector, k=10, method="auto", probes=IVF_PROBES):
+        if not vector.any():
+            return []
+        if method == "auto":
+            method = "ann" if self.ann is not None else "exact"
+        ids = None
+        if method == "ann":
+            if self.ann is None:
+                self.ann = ClusterIndex(self.matrix)
+            ids = self.ann.candidates(vector, probes)
+            if len(ids) < k:
+                ids = None
+        scores = np.asarray(self.matrix if ids is None else self.matrix[ids]) @ vector
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i if ids is None else ids[i]), float(scores[i])) for i in top]
+
+
+# Fusión con el puntaje por palabras clave de chat(): una similitud de 0.5 suma 30 puntos
+SEMANTIC_TOP_K = 10
+SEMANTIC_MIN_SIMILARITY = 0.15
+SEMANTIC_SCORE_WEIGHT = 60
+# Igual a MIN_SUGGESTION_SCORE de chat(): solo se reordenan procedimientos que ya
+# serían sugeridos por palabras clave. Un procedimiento sin evidencia léxica (o que
+# el puntaje por palabras clave penalizó) nunca entra por similitud de n-gramas:
+# "buenos dias" o "capital de francia" tienen similitudes de 0.15-0.25 con trámites al azar.
+SEMANTIC_MIN_KEYWORD_SCORE = 5
+# Uno menos que STRONG_MATCH_SCORE_THRESHOLD de chat(): el bono nunca convierte por sí
+# solo una consulta en respuesta directa
+SEMANTIC_SCORE_CEILING = 49
+
+
+def merge_semantic_scores(scored_procedures, semantic_results):
+    """
+    Reordena con la similitud semántica: a cada (score, proc) con score >=
+    SEMANTIC_MIN_KEYWORD_SCORE le suma la similitud ponderada, sin pasar de
+    SEMANTIC_SCORE_CEILING (un puntaje que ya lo superaba conserva la suma completa).
+    No agrega procedimientos ni toca los de puntaje menor, así que las decisiones de
+    chat() (no TUPA, sin coincidencia, sugerencias o respuesta directa) no cambian.
+    Retorna una lista nueva.
+    """
+    bonus = {id(proc): round(similarity * SEMANTIC_SCORE_WEIGHT)
+             for proc, similarity in semantic_results if similarity >= SEMANTIC_MIN_SIMILARITY}
+    if not bonus:
+        return scored_procedures
+    merged = []
+    for score, proc in scored_procedures:
+        extra = bonus.get(id(proc), 0) if score >= SEMANTIC_MIN_KEYWORD_SCORE else 0
+        merged.append((score + extra if score > SEMANTIC_SCORE_CEILING else
+                       min(score + extra, SEMANTIC_SCORE_CEILING), proc))
+    return merged
+
+
+def create_semantic_index(procedures, data_dir):
+    """Crea el índice si SEMANTIC_RETRIEVAL=1 y NumPy está instalado; None en otro caso."""
+    if os.environ.get("SEMANTIC_RETRIEVAL", "") != "1":
+        return None
+    if not numpy_available():
+        logging.warning("SEMANTIC_RETRIEVAL=1 pero NumPy no está instalado; recuperación semántica desactivada.")
+        return None
+    return SemanticIndex.load_or_build(procedures, data_dir, int(os.environ.get("SEMANTIC_DIM", SEMANTIC_DIM)))
+
+
+def main(argv=None):
+    from near_duplicates import canonicalize_procedures
+    from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+
+    parser = argparse.ArgumentParser(description="Precalcula la matriz semántica de un directorio TUPA.")
+    parser.add_argument("--data-dir", default=TUPA_DATA_DIR, help="Directorio con los archivos TUPA")
+    parser.add_argument("--dim", type=int, default=SEMANTIC_DIM, help="Dimensiones (potencia de 2)")
+    args = parser.parse_args(argv)
+    if not numpy_available():
+        print("NumPy no está instalado.", file=sys.stderr)
+        return 1
+    if args.dim & (args.dim - 1):
+        parser.error("--dim debe ser potencia de 2")
+
+    logging.disable(logging.INFO)
+    _, procedures, _ = canonicalize_procedures(load_tupa_data(args.data_dir))
+    index = SemanticIndex.build(procedures, args.dim)
+    index.save(args.data_dir)
+    print(f"Índice semántico versión {index.version}: {index.matrix.shape[0]} x {index.dim} "
+          f"({index.matrix.nbytes / 1024:.0f} KiB) en {args.data_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import mimetypes
+import os
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+# --- SERVICIO DEL FRONTEND DESDE EL MISMO ORIGEN QUE LA API ---
+# Si existe frontend/dist (generado con build_static.py) se sirven los archivos
+# con hash y caché inmutable, eligiendo la variante .br/.gz según Accept-Encoding.
+# Si no existe, se sirve el frontend fuente sin caché (modo desarrollo).
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+FRONTEND_DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+NO_CACHE_CONTROL = "no-cache"
+
+PRECOMPRESSED_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def frontend_root():
+    return FRONTEND_DIST_DIR if os.path.isdir(FRONTEND_DIST_DIR) else FRONTEND_DIR
+
+
+def serve_frontend_file(filename):
+    """Envía un archivo del frontend con la política de caché y codificación adecuadas."""
+    root = frontend_root()
+    path = safe_join(root, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    is_fingerprinted = root == FRONTEND_DIST_DIR and filename.startswith('static/')
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    served_path, encoding = path, None
+    for candidate_encoding, suffix in PRECOMPRESSED_VARIANTS:
+        if candidate_encoding in accepted and os.path.isfile(path + suffix):
+            served_path, encoding = path + suffix, candidate_encoding
+            break
+
+    response = send_file(served_path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if is_fingerprinted else NO_CACHE_CONTROL
+    return response
+
+
+def send_precompressed_bytes(data, compressed, mimetype, etag, immutable=False):
+    """Envía contenido generado en memoria (p. ej. el índice de búsqueda) con su versión gzip."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(compressed, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else NO_CACHE_CONTROL
+    return response
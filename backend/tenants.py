@@ -0,0 +1,202 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from tupa_loader import TUPA_DATA_DIR, load_tupa_data
+from autocomplete import AutocompleteIndex
+from near_duplicates import canonicalize_procedures
+from passage_index import PassageIndex
+from search_bundle import build_search_bundle, serialize_search_bundle
+from semantic_index import create_semantic_index
+
+# --- REGISTRO DE MUNICIPALIDADES (TENANTS) ---
+# Cada tenant tiene su propio directorio de datos TUPA, índices y caché de
+# respuestas. Se cargan en la primera petición y los menos usados se descargan
+# cuando se supera el número máximo de tenants residentes o el presupuesto de memoria.
+
+# DEFAULT_TENANT y TUPA_TENANTS_DIR se leen al crear el registro (create_tenant_registry),
+# después de que create_app() cargó el .env, no al importar este módulo
+DEFAULT_TENANTS_DIR = os.path.join(os.path.dirname(__file__), 'tenants')
+
+
+class LRUCache:
+    """
+    Caché LRU acotada por número de entradas y por bytes (tamaño estimado de clave
+    y valor), segura entre hilos. `size_bytes` cuenta en el presupuesto del tenant.
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        entry_bytes = estimate_size(key) + estimate_size(value)
+        if self.max_bytes is not None and entry_bytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+            self._data[key] = (value, entry_bytes)
+            self.size_bytes += entry_bytes
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self.size_bytes > self.max_bytes):
+                _, (_, evicted_bytes) = self._data.popitem(last=False)
+                self.size_bytes -= evicted_bytes
+
+    def __len__(self):
+        return len(self._data)
+
+
+def estimate_size(obj, seen=None):
+    """Tamaño aproximado en bytes de un objeto y todo lo que contiene (dict, list, tuple, set, str)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+class Tenant:
+    """Corpus TUPA de una municipalidad con sus índices y su caché de respuestas."""
+
+    def __init__(self, tenant_id, data_dir, response_cache_size, response_cache_bytes=None):
+        start = time.perf_counter()
+        self.tenant_id = tenant_id
+        self.data_dir = data_dir
+        # Los duplicados se colapsan al cargar: `procedure_list` tiene un registro por
+        # procedimiento (títulos distintos) y las claves de los alias apuntan al canónico.
+        # Los casi duplicados para revisión editorial se reportan con near_duplicates.py.
+        self.procedures, self.procedure_list, self.merged_duplicates = \
+            canonicalize_procedures(load_tupa_data(data_dir))
+        self.autocomplete_index = AutocompleteIndex(self.procedures)
+        self.passage_index = PassageIndex(self.procedure_list)
+        # None salvo con SEMANTIC_RETRIEVAL=1 y NumPy instalado
+        self.semantic_index = create_semantic_index(self.procedure_list, data_dir)
+        self.search_bundle = build_search_bundle(self.procedures)
+        self.search_bundle_json, self.search_bundle_gzip = serialize_search_bundle(self.search_bundle)
+        self.response_cache = LRUCache(response_cache_size, response_cache_bytes)
+        self.load_seconds = time.perf_counter() - start
+        self.footprint_bytes = estimate_size([self.procedures, self.procedure_list, self.autocomplete_index,
+                                              self.passage_index, self.search_bundle]) + \
+            len(self.search_bundle_json) + len(self.search_bundle_gzip)
+        if self.semantic_index is not None and not self.semantic_index.mmapped:
+            self.footprint_bytes += self.semantic_index.matrix.nbytes
+
+
+def discover_tenant_dirs(default_tenant_id, tenants_dir):
+    """
+    Mapa {tenant: directorio de datos}. El tenant por defecto usa TUPA_DATA_DIR;
+    los demás se descubren como subdirectorios de `tenants_dir`
+    (tenants/<id>/tupa_data o directamente tenants/<id>).
+    """
+    data_dirs = {default_tenant_id: TUPA_DATA_DIR}
+    if os.path.isdir(tenants_dir):
+        for tenant_id in sorted(os.listdir(tenants_dir)):
+            tenant_dir = os.path.join(tenants_dir, tenant_id)
+            if not os.path.isdir(tenant_dir):
+                continue
+            nested = os.path.join(tenant_dir, 'tupa_data')
+            data_dirs[tenant_id.lower()] = nested if os.path.isdir(nested) else tenant_dir
+    return data_dirs
+
+
+class TenantRegistry:
+    """
+    Carga perezosa de tenants con expulsión LRU. `get` retorna None si el tenant no existe.
+    Cada tenant se carga una sola vez aunque lleguen varias peticiones simultáneas.
+    """
+
+    def __init__(self, data_dirs, max_resident=4, max_memory_bytes=256 * 1024 * 1024, response_cache_size=512,
+                 response_cache_bytes=8 * 1024 * 1024, default_tenant_id="puno"):
+        self.data_dirs = data_dirs
+        self.default_tenant_id = default_tenant_id
+        self.response_cache_bytes = response_cache_bytes
+        self.max_resident = max_resident
+        self.max_memory_bytes = max_memory_bytes
+        self.response_cache_size = response_cache_size
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, tenant_id):
+        with self._lock:
+            tenant = self._resident.get(tenant_id)
+            if tenant is not None:
+                self._resident.move_to_end(tenant_id)
+                # Las cachés de respuestas crecen después de la carga: el presupuesto se revisa en cada acceso
+                self._evict(keep=tenant_id)
+                return tenant
+            if tenant_id not in self.data_dirs:
+                return None
+            load_lock = self._load_locks.setdefault(tenant_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                tenant = self._resident.get(tenant_id)
+            if tenant is not None:
+                return tenant
+
+            tenant = Tenant(tenant_id, self.data_dirs[tenant_id], self.response_cache_size,
+                            self.response_cache_bytes)
+            logging.info(f"Tenant '{tenant_id}' cargado en {tenant.load_seconds:.3f} s "
+                         f"(~{tenant.footprint_bytes / 1024:.0f} KiB, {len(tenant.procedure_list)} procedimientos, "
+                         f"{len(tenant.merged_duplicates)} duplicados fusionados).")
+            with self._lock:
+                self._resident[tenant_id] = tenant
+                self._evict(keep=tenant_id)
+        return tenant
+
+    def _evict(self, keep):
+        """Expulsa los tenants menos usados mientras se excedan los límites (nunca `keep`)."""
+        while len(self._resident) > 1 and (
+                len(self._resident) > self.max_resident or self.resident_bytes() > self.max_memory_bytes):
+            oldest_id = next(iter(self._resident))
+            if oldest_id == keep:
+                break
+            del self._resident[oldest_id]
+            logging.info(f"Tenant '{oldest_id}' expulsado de memoria.")
+
+    def resident_bytes(self):
+        """Índices y corpus de cada tenant más lo que ocupa hoy su caché de respuestas."""
+        return sum(t.footprint_bytes + t.response_cache.size_bytes for t in self._resident.values())
+
+    def resident_tenants(self):
+        with self._lock:
+            return list(self._resident.values())
+
+
+def create_tenant_registry():
+    default_tenant_id = os.environ.get("DEFAULT_TENANT", "puno").lower()
+    return TenantRegistry(
+        discover_tenant_dirs(default_tenant_id, os.environ.get("TUPA_TENANTS_DIR", DEFAULT_TENANTS_DIR)),
+        max_resident=int(os.environ.get("MAX_RESIDENT_TENANTS", "4")),
+        max_memory_bytes=int(float(os.environ.get("MAX_TENANT_MEMORY_MB", "256")) * 1024 * 1024),
+        response_cache_size=int(os.environ.get("RESPONSE_CACHE_SIZE", "512")),
+        response_cache_bytes=int(float(os.environ.get("RESPONSE_CACHE_MB", "8")) * 1024 * 1024),
+        default_tenant_id=default_tenant_id,
+    )
@@ -0,0 +1,146 @@
+"""
+Pruebas offline del limitador de tasa y del control de admisión (admission.py).
+
+Uso (desde backend/):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from admission import AdmissionController, RateLimiter
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        time.sleep(0.001)
+
+
+# --- RateLimiter (reloj explícito, determinista) ---
+
+def test_rate_limiter_burst_then_refill():
+    limiter = RateLimiter(rate=1, burst=3)
+    assert [limiter.allow("ip:a", now=0.0)[0] for _ in range(3)] == [True, True, True]
+    assert limiter.allow("ip:a", now=0.0) == (False, 1.0)
+    allowed, retry_after = limiter.allow("ip:a", now=0.5)
+    assert not allowed and abs(retry_after - 0.5) < 1e-9
+    assert limiter.allow("ip:a", now=1.0) == (True, 0.0)
+    assert not limiter.allow("ip:a", now=1.0)[0]
+
+
+def test_rate_limiter_keys_are_independent():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.allow("ip:a", now=0.0)[0]
+    assert not limiter.allow("ip:a", now=0.0)[0]
+    assert limiter.allow("ip:b", now=0.0)[0]
+
+
+def test_rate_limiter_refill_is_capped_at_burst():
+    limiter = RateLimiter(rate=10, burst=2)
+    limiter.allow("ip:a", now=0.0)
+    results = [limiter.allow("ip:a", now=100.0)[0] for _ in range(3)]
+    assert results == [True, True, False]
+
+
+def test_rate_limiter_prunes_idle_keys():
+    limiter = RateLimiter(rate=1, burst=2, stripes=1, max_keys_per_stripe=1)
+    limiter.allow("ip:a", now=0.0)
+    limiter.allow("ip:b", now=10.0)
+    buckets, _ = limiter._stripes[0]
+    assert list(buckets) == ["ip:b"]
+
+
+def test_rate_limiter_concurrent_clients_share_one_burst():
+    limiter = RateLimiter(rate=1, burst=5)
+    results, barrier = [], threading.Barrier(20)
+
+    def worker():
+        barrier.wait()
+        results.append(limiter.allow("ip:a", now=0.0)[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 5
+
+
+# --- AdmissionController (varios hilos) ---
+
+def test_admission_admits_when_slot_free_and_releases():
+    controller = AdmissionController(max_in_flight=2, max_queue=1, queue_timeout=1)
+    assert controller.acquire() is False
+    assert controller.in_flight == 1
+    controller.release()
+    assert controller.in_flight == 0
+    assert not controller.is_under_pressure()
+
+
+def test_admission_queues_then_degrades_and_rejects_when_queue_full():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=2)
+    assert controller.acquire() is False
+    queued = {}
+
+    def waiter():
+        queued["result"] = controller.acquire()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_until(lambda: controller.waiting == 1)
+    assert controller.is_under_pressure()
+
+    # Cola llena: se rechaza sin esperar
+    assert controller.acquire() is None
+
+    controller.release()
+    thread.join(2)
+    assert queued["result"] is True  # tuvo que esperar: modo degradado
+    assert controller.in_flight == 1 and controller.waiting == 0
+    controller.release()
+    assert controller.in_flight == 0
+
+
+def test_admission_rejects_after_queue_timeout():
+    controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+    controller.acquire()
+    start = time.monotonic()
+    assert controller.acquire() is None
+    assert time.monotonic() - start >= 0.04
+    assert controller.waiting == 0 and controller.in_flight == 1
+    controller.release()
+    assert controller.in_flight == 0
+
+
+def test_admission_never_exceeds_max_in_flight_under_load():
+    controller = AdmissionController(max_in_flight=3, max_queue=50, queue_timeout=5)
+    lock, active, peak, outcomes = threading.Lock(), [0], [0], []
+
+    def worker():
+        degraded = controller.acquire()
+        outcomes.append(degraded)
+        if degraded is None:
+            return
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.005)
+        with lock:
+            active[0] -= 1
+        controller.release()
+
+    threads = [threading.Thread(target=worker) for _ in range(24)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert None not in outcomes
+    assert peak[0] <= 3
+    assert True in outcomes  # alguna petición esperó en cola
+    assert controller.in_flight == 0 and controller.waiting == 0
@@ -0,0 +1,68 @@
+"""
+Pruebas de la fusión de la recuperación semántica con el puntaje por palabras clave
+(semantic_index.merge_semantic_scores) y de que no cambia las ramas de /chat.
+
+Uso (desde backend/):
+    python -m pytest -q tests
+"""
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from semantic_index import SEMANTIC_SCORE_CEILING, merge_semantic_scores
+
+BRANCH_QUERIES = ["cual es la capital de francia", "buenos dias", "donde queda la municipalidad",
+                     "partida de nacimiento de mi hijo", "inscribir a mi bebe"]
+
+
+def procs(*titles):
+    return [{"titulo": title} for title in titles]
+
+
+def test_merge_never_adds_procedures_without_keyword_score():
+    canes, vehicular = procs("REGISTRO MUNICIPAL DE CANES", "CONSTANCIA VEHICULAR")
+    # Consulta fuera de tema: ninguna coincidencia por palabras clave, similitudes de ruido
+    assert merge_semantic_scores([], [(canes, 0.25), (vehicular, 0.9)]) == []
+
+
+def test_merge_only_boosts_procedures_that_would_already_be_suggested():
+    weak, strong, other = procs("A", "B", "C")
+    merged = merge_semantic_scores([(3, weak), (10, strong)], [(weak, 0.9), (strong, 0.5), (other, 0.9)])
+    assert merged == [(3, weak), (40, strong)]
+
+
+def test_merge_bonus_never_reaches_a_direct_answer():
+    low, high = procs("A", "B")
+    merged = dict((proc["titulo"], score) for score, proc in
+                  merge_semantic_scores([(20, low), (60, high)], [(low, 0.95), (high, 0.95)]))
+    assert merged == {"A": SEMANTIC_SCORE_CEILING, "B": 60 + round(0.95 * 60)}
+
+
+def test_merge_ignores_similarities_below_threshold():
+    proc, = procs("A")
+    assert merge_semantic_scores([(8, proc)], [(proc, 0.1)]) == [(8, proc)]
+
+
+def chat_branches(monkeypatch, semantic):
+    pytest.importorskip("flask")
+    monkeypatch.setenv("RATE_LIMIT_PER_SECOND", "0")
+    monkeypatch.setenv("SEMANTIC_RETRIEVAL", "1" if semantic else "0")
+    logging.disable(logging.CRITICAL)
+    try:
+        import app
+        client = app.create_app("sync").test_client()
+        return {q: client.post('/chat', json={"message": q}).headers.get('X-Chat-Branch') for q in BRANCH_QUERIES}
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def test_off_topic_queries_keep_their_branch_with_semantic_retrieval(monkeypatch):
+    pytest.importorskip("numpy")
+    without = chat_branches(monkeypatch, semantic=False)
+    with_semantic = chat_branches(monkeypatch, semantic=True)
+    assert with_semantic == without
+    assert with_semantic["buenos dias"] == "no_tupa"
@@ -0,0 +1,241 @@
+import os
+import re
+import logging
+
+# --- LÓGICA DE CARGA DE PROCEDIMIENTOS TUPA ---
+
+TUPA_DATA_DIR = os.path.join(os.path.dirname(__file__), 'tupa_data')
+
+def load_tupa_data(data_dir=TUPA_DATA_DIR):
+    """
+    Carga los datos de los procedimientos TUPA desde archivos .txt.
+    Asegura que el 'Titulo:' y 'Código:' sean capturados,
+    y mejora el parseo de la 'Descripción del Servicio' para contenido multilínea.
+    Retorna un diccionario {clave de búsqueda: procedimiento}; cada procedimiento
+    aparece bajo su título y, si no colisiona, bajo su código.
+    """
+    tupa_procedures = {}
+    logging.info(f"Ruta absoluta del directorio TUPA: {os.path.abspath(data_dir)}")
+
+    if not os.path.exists(data_dir):
+        logging.error(f"Error: El directorio {data_dir} no existe. Asegúrate de que la carpeta 'tupa_data' esté en el mismo nivel que 'app.py'.")
+        return tupa_procedures
+    
+    if not os.path.isdir(data_dir):
+        logging.error(f"Error: {data_dir} no es un directorio.")
+        return tupa_procedures
+
+    files_in_dir = [f for f in os.listdir(data_dir) if f.endswith(".txt")]
+    if not files_in_dir:
+        logging.warning(f"El directorio '{data_dir}' está vacío o no contiene archivos .txt. No se cargarán datos TUPA.")
+        return tupa_procedures
+
+    logging.info(f"Iniciando carga de datos TUPA desde: {data_dir}. Archivos encontrados: {files_in_dir}")
+
+    section_keywords = {
+        "Titulo:": "titulo",
+        "Código:": "codigo",
+        "Requisitos:": "requisitos",
+        "Canales de atención:": "canales_atencion",
+        "Pago por derecho de tramitación:": "pago_derecho_tramitacion",
+        "Modalidad de pago:": "modalidad_pago",
+        "Plazo:": "plazo",
+        "Sedes y horarios de atención:": "sedes_horarios",
+        "Unidad de organización donde se presenta la documentación:": "unidad_presentacion",
+        "Unidad de organización responsable de aprobar la solicitud:": "unidad_aprobacion",
+        "Consulta sobre el servicio:": "consulta_servicio"
+    }
+    
+    # NUEVO: Lista de palabras clave para la descripción
+    description_keywords_list = ["Descripción del procedimiento:", "Descripción del Servicio:"]
+
+    sub_section_keywords = {
+        "Monto -": "monto", 
+        "Efectivo:": "efectivo", 
+        "Teléfono:": "telefono_consulta", 
+        "Anexo:": "anexo_consulta", 
+        "Correo:": "correo_consulta" 
+    }
+
+    for filename in files_in_dir:
+        file_path = os.path.join(data_dir, filename)
+        logging.info(f"Procesando archivo: {filename}")
+        
+        procedure_data = {
+            "titulo": "",
+            "codigo": "", 
+            "descripcion": "", 
+            "requisitos": [],
+            "canales_atencion": [],
+            "pago_derecho_tramitacion": {"monto": "", "modalidad": []}, 
+            "plazo": "",
+            "sedes_horarios": [],
+            "unidad_presentacion": "",
+            "unidad_aprobacion": "",
+            "consulta_servicio": {"telefono": "", "anexo": "", "correo": ""} 
+        }
+        
+        current_main_section = None 
+        
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+                i = 0
+                while i < len(lines):
+                    line = lines[i].strip()
+                    i += 1
+                    
+                    if not line: 
+                        continue
+
+                    matched_section = False
+                    
+                    # Primero, intenta coincidir con las palabras clave de descripción
+                    for desc_kw in description_keywords_list:
+                        if line.startswith(desc_kw):
+                            current_main_section = "descripcion"
+                            desc_content = []
+                            # Si hay contenido en la misma línea después de la palabra clave
+                            if line.replace(desc_kw, "", 1).strip():
+                                desc_content.append(line.replace(desc_kw, "", 1).strip())
+                            
+                            temp_i = i # Usar un índice temporal para leer líneas adicionales de descripción
+                            # Continúa leyendo hasta que encuentre una nueva sección principal o el final del archivo
+                            while temp_i < len(lines) and \
+                                  not any(lines[temp_i].strip().startswith(kw) for kw in section_keywords.keys()) and \
+                                  not any(lines[temp_i].strip().startswith(dk) for dk in description_keywords_list):
+                                if lines[temp_i].strip():
+                                    desc_content.append(lines[temp_i].strip())
+                                temp_i += 1
+                            i = temp_i # Actualiza el índice principal
+                            procedure_data["descripcion"] = " ".join(desc_content).strip()
+                            logging.info(f"DEBUG_DESCRIPCION: Descripción parseada para '{filename}': '{procedure_data['descripcion']}'") 
+                            matched_section = True
+                            break # Salir del bucle de description_keywords_list una vez encontrada
+                    
+                    if matched_section: # Si ya se procesó la descripción, pasar a la siguiente línea
+                        continue 
+
+                    # Luego, verifica las otras palabras clave de sección principales
+                    for keyword, attr_name in section_keywords.items():
+                        if line.startswith(keyword):
+                            current_main_section = attr_name
+                            matched_section = True
+                            
+                            if keyword == "Titulo:":
+                                procedure_data["titulo"] = line.replace(keyword, "", 1).strip()
+                                logging.debug(f"  Título detectado: '{procedure_data['titulo']}'")
+                                break
+                            elif keyword == "Código:":
+                                code_content = line.replace(keyword, "", 1).strip()
+                                if not code_content and i < len(lines):
+                                    next_line_content = lines[i].strip()
+                                    if next_line_content and not any(next_line_content.startswith(kw) for kw in section_keywords.keys()):
+                                        code_content = next_line_content
+                                        i += 1 
+                                procedure_data["codigo"] = code_content
+                                logging.debug(f"  Código detectado: '{procedure_data['codigo']}'")
+                                break
+                            elif keyword == "Plazo:":
+                                procedure_data["plazo"] = line.replace(keyword, "", 1).strip()
+                                logging.debug(f"  Plazo detectado: '{procedure_data['plazo']}'")
+                                break
+                            # Las descripciones ya se manejan arriba, así que este 'elif attr_name == "descripcion":' se elimina.
+                    
+                    if matched_section:
+                        continue 
+
+                    if current_main_section:
+                        def add_to_list_or_concat_last(target_list, current_line):
+                            # Modificado para asegurar que no se añadan líneas vacías o nuevas secciones accidentalmente
+                            if current_line.strip() and not any(current_line.startswith(kw) for kw in section_keywords.keys()) and not any(current_line.startswith(dk) for dk in description_keywords_list):
+                                if re.match(r'^\d+\.-\s*.+', current_line) or re.match(r'^-+\s*.+', current_line): 
+                                    target_list.append(current_line.strip())
+                                else: 
+                                    if target_list:
+                                        target_list[-1] += " " + current_line.strip()
+                                    else: 
+                                        target_list.append(current_line.strip())
+
+                        if current_main_section == "requisitos":
+                            add_to_list_or_concat_last(procedure_data["requisitos"], line)
+                        
+                        elif current_main_section == "canales_atencion":
+                            add_to_list_or_concat_last(procedure_data["canales_atencion"], line)
+                        
+                        elif current_main_section == "sedes_horarios":
+                            add_to_list_or_concat_last(procedure_data["sedes_horarios"], line)
+                        
+                        elif current_main_section == "pago_derecho_tramitacion":
+                            found_sub_section = False
+                            for sub_keyword, sub_attr_name in sub_section_keywords.items():
+                                if line.startswith(sub_keyword):
+                                    if sub_attr_name == "monto":
+                                        procedure_data["pago_derecho_tramitacion"][sub_attr_name] = line.replace(sub_keyword, "", 1).strip()
+                                    found_sub_section = True
+                                    break
+                            if not found_sub_section and line.strip(): 
+                                if line not in procedure_data["pago_derecho_tramitacion"]["modalidad"]:
+                                    procedure_data["pago_derecho_tramitacion"]["modalidad"].append(line.strip())
+                        
+                        elif current_main_section == "modalidad_pago": 
+                            if line.strip() and line not in procedure_data["pago_derecho_tramitacion"]["modalidad"]:
+                                 procedure_data["pago_derecho_tramitacion"]["modalidad"].append(line.strip())
+
+                        elif current_main_section == "unidad_presentacion":
+                            if not any(line.startswith(kw) for kw in section_keywords.keys()) and not any(line.startswith(dk) for dk in description_keywords_list):
+                                if not procedure_data["unidad_presentacion"]:
+                                    procedure_data["unidad_presentacion"] = line.strip()
+                                else:
+                                    procedure_data["unidad_presentacion"] += " " + line.strip()
+                        elif current_main_section == "unidad_aprobacion":
+                            if not any(line.startswith(kw) for kw in section_keywords.keys()) and not any(line.startswith(dk) for dk in description_keywords_list):
+                                if not procedure_data["unidad_aprobacion"]:
+                                    procedure_data["unidad_aprobacion"] = line.strip()
+                                else:
+                                    procedure_data["unidad_aprobacion"] += " " + line.strip()
+
+                        elif current_main_section == "consulta_servicio":
+                            found_sub_section = False
+                            for sub_keyword, sub_attr_name in sub_section_keywords.items():
+                                if line.startswith(sub_keyword):
+                                    if sub_attr_name in ["telefono_consulta", "anexo_consulta", "correo_consulta"]:
+                                        procedure_data["consulta_servicio"][sub_attr_name.replace('_consulta', '')] = line.replace(sub_keyword, "", 1).strip()
+                                        found_sub_section = True
+                                        break
+                            if not found_sub_section and line.strip(): 
+                                if re.search(r'\b(tel(?:éfono)?|cel(?:ular)?|anexo)\b', line.lower()) or re.match(r'^\d{6,}', line.strip()):
+                                    procedure_data["consulta_servicio"]["telefono"] = line.strip()
+                                elif "@" in line:
+                                    procedure_data["consulta_servicio"]["correo"] = line.strip()
+                                elif "anexo" in line.lower():
+                                    procedure_data["consulta_servicio"]["anexo"] = line.strip()
+
+        except Exception as e:
+            logging.error(f"Error al procesar el archivo {filename}: {e}")
+            logging.error(f"Contenido actual de procedure_data antes del error: {procedure_data}")
+            continue 
+
+        final_key_for_search = procedure_data["titulo"].lower().strip() if procedure_data["titulo"] else os.path.splitext(filename)[0].lower()
+        
+        original_final_key = final_key_for_search
+        counter = 1
+        while final_key_for_search in tupa_procedures:
+            final_key_for_search = f"{original_final_key}-{counter}"
+            counter += 1
+        
+        tupa_procedures[final_key_for_search] = procedure_data
+        
+        if procedure_data["codigo"] and procedure_data["codigo"].lower().strip() not in tupa_procedures:
+             tupa_procedures[procedure_data["codigo"].lower().strip()] = procedure_data
+        
+        logging.info(f"Cargado TUPA: \"{procedure_data['titulo'] if procedure_data['titulo'] else 'N/A'}\" (Clave principal: \"{final_key_for_search}\")")
+        logging.debug(f"  Datos finales de '{filename}':")
+        logging.debug(f"    Título: '{procedure_data['titulo']}'")
+        logging.debug(f"    Código: '{procedure_data['codigo']}'")
+        logging.debug(f"    Descripción (inicio): '{procedure_data['descripcion'][:100]}...'")
+        logging.debug(f"    Requisitos (num): {len(procedure_data['requisitos'])}")
+    
+    logging.info(f"Carga de datos TUPA finalizada. Total de procedimientos cargados: {len(tupa_procedures)}")
+    logging.info(f"Claves principales de procedimientos cargados: {list(tupa_procedures.keys())}")
+    return tupa_procedures
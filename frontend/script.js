@@ -2,7 +2,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const chatMessages = document.getElementById('chat-messages');
     const userInput = document.getElementById('user-input');
     const sendButton = document.getElementById('send-button');
-    const BACKEND_URL = 'http://127.0.0.1:5000/chat';
+    // Servido por Flask: mismo origen que la API (sin preflight CORS); bajo /t/<municipalidad>/
+    // se usan las rutas de esa municipalidad.
+    // Abierto como archivo o con Live Server (puerto 5501): apunta al backend local.
+    const tenantMatch = window.location.pathname.match(/^\/t\/([\w-]+)\//);
+    const API_BASE = (window.location.protocol === 'file:' || window.location.port === '5501')
+        ? 'http://127.0.0.1:5000'
+        : (tenantMatch ? `/t/${tenantMatch[1]}` : '');
+    const BACKEND_URL = `${API_BASE}/chat`;
 
     const municipalLogoSrc = 'assets/logo.jpg';
     const botAvatarSrc = 'assets/botmuni.png';
@@ -174,10 +181,201 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 4);
     }
 
+    // --- Autocompletado de procedimientos (GET /autocomplete con debounce) ---
+    const autocompleteList = document.getElementById('autocomplete-list');
+    const AUTOCOMPLETE_URL = `${API_BASE}/autocomplete`;
+    const AUTOCOMPLETE_DEBOUNCE_MS = 150;
+    let autocompleteTimer = null;
+    let autocompleteController = null;
+    let activeSuggestionIndex = -1;
+
+    function hideAutocomplete() {
+        clearTimeout(autocompleteTimer);
+        if (autocompleteController) {
+            autocompleteController.abort();
+            autocompleteController = null;
+        }
+        activeSuggestionIndex = -1;
+        autocompleteList.hidden = true;
+        autocompleteList.innerHTML = '';
+    }
+
+    function renderAutocomplete(suggestions) {
+        autocompleteList.innerHTML = '';
+        activeSuggestionIndex = -1;
+        if (suggestions.length === 0) {
+            autocompleteList.hidden = true;
+            return;
+        }
+        suggestions.forEach(suggestion => {
+            const item = document.createElement('div');
+            item.classList.add('autocomplete-item');
+            item.textContent = suggestion.titulo;
+            item.title = suggestion.codigo;
+            // mousedown en lugar de click: se dispara antes de que el input pierda el foco
+            item.addEventListener('mousedown', (e) => {
+                e.preventDefault();
+                hideAutocomplete();
+                sendMessage(suggestion.titulo);
+            });
+            autocompleteList.appendChild(item);
+        });
+        autocompleteList.hidden = false;
+    }
+
+    function highlightSuggestion(index) {
+        const items = autocompleteList.querySelectorAll('.autocomplete-item');
+        if (items.length === 0) return;
+        activeSuggestionIndex = (index + items.length) % items.length;
+        items.forEach((item, i) => item.classList.toggle('active', i === activeSuggestionIndex));
+        items[activeSuggestionIndex].scrollIntoView({ block: 'nearest' });
+    }
+
+    // --- Índice de búsqueda local: las sugerencias se calculan en el navegador ---
+    // /corpus_version es diminuto y sin caché; /search_index.json?v=<versión> queda en la
+    // caché HTTP del navegador (inmutable) hasta que cambie el corpus.
+    const SEARCH_INDEX_FORMAT = 1;
+    let searchIndex = null;
+
+    function foldText(text) {
+        return text.toLowerCase()
+            .normalize('NFD').replace(/[\u0300-\u036f]/g, '')
+            .replace(/[^\w\s]/g, ' ')
+            .split(/\s+/).filter(Boolean).join(' ');
+    }
+
+    async function loadSearchIndex() {
+        try {
+            const versionResponse = await fetch(`${API_BASE}/corpus_version`);
+            if (!versionResponse.ok) return;
+            const { version } = await versionResponse.json();
+            const response = await fetch(`${API_BASE}/search_index.json?v=${encodeURIComponent(version)}`);
+            if (!response.ok) return;
+            const bundle = await response.json();
+            if (bundle.format !== SEARCH_INDEX_FORMAT) return;
+            bundle.foldedTitles = bundle.titles.map(foldText);
+            searchIndex = bundle;
+        } catch (error) {
+            // Sin índice local se sigue usando /autocomplete del servidor
+            console.error('No se pudo cargar el índice de búsqueda local:', error);
+        }
+    }
+
+    function lowerBound(sortedList, value) {
+        let lo = 0;
+        let hi = sortedList.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (sortedList[mid] < value) lo = mid + 1; else hi = mid;
+        }
+        return lo;
+    }
+
+    function rankLocally(query, limit = 8) {
+        const folded = foldText(query);
+        const { tokens, postings, synonyms, titles, codes, foldedTitles } = searchIndex;
+        const scores = new Map();
+        const addScore = (doc, points) => scores.set(doc, (scores.get(doc) || 0) + points);
+
+        Object.entries(synonyms).forEach(([synonym, docs]) => {
+            if (synonym.startsWith(folded) || folded.includes(synonym)) {
+                docs.forEach(doc => addScore(doc, 30));
+            }
+        });
+
+        // Mismos pesos que el servidor: 10 por palabra en el título, 4 en la descripción.
+        // La última palabra se busca como prefijo porque el usuario aún la está escribiendo.
+        const words = folded.split(' ').filter(word => word.length > 2);
+        words.forEach((word, wordIndex) => {
+            const isLastWord = wordIndex === words.length - 1;
+            const bestForWord = new Map();
+            for (let i = lowerBound(tokens, word); i < tokens.length; i++) {
+                if (isLastWord ? !tokens[i].startsWith(word) : tokens[i] !== word) break;
+                postings[i].forEach(posting => {
+                    const doc = posting >> 1;
+                    const points = (posting & 1) ? 10 : 4;
+                    bestForWord.set(doc, Math.max(bestForWord.get(doc) || 0, points));
+                });
+            }
+            bestForWord.forEach((points, doc) => addScore(doc, points));
+        });
+
+        foldedTitles.forEach((title, doc) => {
+            if (folded.length >= 3 && title.startsWith(folded)) addScore(doc, 15);
+        });
+        codes.forEach((code, doc) => {
+            if (folded.length >= 3 && code.toLowerCase().startsWith(folded)) addScore(doc, 50);
+        });
+
+        return [...scores.entries()]
+            .sort((a, b) => (b[1] - a[1]) || (titles[a[0]].length - titles[b[0]].length))
+            .slice(0, limit)
+            .map(([doc]) => ({ titulo: titles[doc], codigo: codes[doc] }));
+    }
+
+    async function fetchAutocomplete(query) {
+        if (searchIndex) {
+            renderAutocomplete(rankLocally(query));
+            return;
+        }
+        if (autocompleteController) {
+            autocompleteController.abort();
+        }
+        autocompleteController = new AbortController();
+        try {
+            const response = await fetch(`${AUTOCOMPLETE_URL}?q=${encodeURIComponent(query)}`, {
+                signal: autocompleteController.signal,
+            });
+            if (!response.ok) return;
+            const data = await response.json();
+            // La consulta pudo cambiar mientras llegaba la respuesta
+            if (userInput.value.trim() === query && !isBotResponding) {
+                renderAutocomplete(data.suggestions || []);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error al obtener autocompletado:', error);
+            }
+        }
+    }
+
+    userInput.addEventListener('input', () => {
+        clearTimeout(autocompleteTimer);
+        const query = userInput.value.trim();
+        if (query.length < 2) {
+            hideAutocomplete();
+            return;
+        }
+        autocompleteTimer = setTimeout(() => fetchAutocomplete(query), AUTOCOMPLETE_DEBOUNCE_MS);
+    });
+
+    userInput.addEventListener('keydown', (e) => {
+        if (autocompleteList.hidden) return;
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            highlightSuggestion(activeSuggestionIndex + 1);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            highlightSuggestion(activeSuggestionIndex - 1);
+        } else if (e.key === 'Escape') {
+            hideAutocomplete();
+        } else if (e.key === 'Enter' && activeSuggestionIndex >= 0 && !isBotResponding) {
+            // preventDefault evita que el keypress de Enter envíe además el texto escrito
+            e.preventDefault();
+            const title = autocompleteList.querySelectorAll('.autocomplete-item')[activeSuggestionIndex].textContent;
+            hideAutocomplete();
+            sendMessage(title);
+        }
+    });
+
+    userInput.addEventListener('blur', hideAutocomplete);
+
     async function sendMessage(messageFromButton = null) {
         const message = messageFromButton || userInput.value.trim();
         if (message === '') return;
 
+        hideAutocomplete();
+
         addMessage('user', message);
         userInput.value = '';
 
@@ -196,6 +394,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ message: message }),
             });
 
+            // 429/503: el servidor limita la tasa o está saturado y explica el motivo en el cuerpo
+            if (response.status === 429 || response.status === 503) {
+                const data = await response.json();
+                hideLoadingIndicator();
+                addMessage('bot', data.response, 'text');
+                return;
+            }
+
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -231,6 +437,8 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    loadSearchIndex();
+
     window.onload = () => {
         addMessage('bot', '¡Hola! Soy tu **Asistente Municipal de Puno**. Estoy aquí para ayudarte con información sobre los **procedimientos TUPA**. ¿En qué puedo ayudarte hoy?');
     };